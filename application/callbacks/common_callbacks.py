@@ -8,14 +8,15 @@ from callbacks.inpatients import show_inpatients_date  # noqa: F401
 from callbacks.summary import show_summary_date  # noqa: F401
 from classes.to_delete import ToDelete
 from constants import SHOW
-from utils import build_menu, get_diary_today, private_access
+from utils import (build_menu, get_diary_today, private_access,
+                   reply_message)
 
 
 @private_access
 async def get_date_from_message(update: Update,
                                 context: ContextTypes.DEFAULT_TYPE) -> int:
     chat_id = update.message.chat_id
-    to_delete = ToDelete(chat_id=chat_id)
+    to_delete = ToDelete(chat_id)
     to_delete.add(update.message)
     dates = list()
     for n in reversed(range(15)):
@@ -28,7 +29,8 @@ async def get_date_from_message(update: Update,
     reply_markup = ReplyKeyboardMarkup(build_menu(button_list, n_cols=3),
                                        resize_keyboard=True)
     to_delete.add(
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Введите дату в формате: dd.mm.YYYY\n'
             'Например: 01.01.2010\n\n'
             'Или выберите день из списка:',
@@ -49,7 +51,7 @@ async def check_date_from_message(update: Update,
     pattern = re.compile(r'^\d\d\.\d\d\.\d\d\d\d$')
     if not pattern.match(message_text):
         await to_delete.final_delete(context.bot)
-        await update.message.reply_text('Дата введена неверно.')
+        await reply_message(update.message, 'Дата введена неверно.')
         return ConversationHandler.END
     start_date = datetime.strptime(message_text, '%d.%m.%Y').date()
     await context.user_data['show_function'](update, start_date)
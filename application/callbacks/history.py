@@ -1,71 +1,62 @@
+import logging
+import os
 from typing import List
 
+from dotenv import load_dotenv
 from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
                       ReplyKeyboardRemove, Update)
 from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
 
-from classes.patients import Patient, PatientInfo
+from classes.cache import AsyncCache
+from classes.patients import Patient, get_patient_info
 from classes.to_delete import ToDelete
-from constants import (MESSAGE_MAX_SIZE, STATUS_DIS_DIAGNOSIS,
-                       STATUS_INPATIENT, STATUS_OTHER_HOSPITAL,
-                       STATUS_OUTPATIENT, STATUS_OVER_DIAGNOSIS,
-                       STATUS_SELF_DENIAL, STATUS_SELF_LEAVE,
-                       STATUS_UNREASON_DENY, STATUS_UNREASON_DIRECTED)
-from databases.firebird_db import fb_select_data
-from utils import build_menu
+from constants import (STATUS_DIS_DIAGNOSIS, STATUS_INPATIENT,
+                       STATUS_OTHER_HOSPITAL, STATUS_OUTPATIENT,
+                       STATUS_OVER_DIAGNOSIS, STATUS_SELF_DENIAL,
+                       STATUS_SELF_LEAVE, STATUS_UNREASON_DENY,
+                       STATUS_UNREASON_DIRECTED)
+from databases.firebird_db import async_fb_fetch_data
+from databases.queries import build_admissions_query
+from utils import build_menu, chunk_messages, send_chat_message
 
+load_dotenv()
 
-def get_history(patient_id: int) -> List[Patient]:
-    select_query = (
-        "SELECT main_card.id_pac, "
-        "       main_card.id, "
-        "       main_card.d_in, "
-        "       main_card.d_out, "
-        "       patient.fm, "
-        "       patient.im, "
-        "       patient.ot, "
-        "       patient.dtr, "
-        "       patient.pol, "
-        "       department.short, "
-        "       main_card.remzal, "
-        "       main_card.dsnapr, "
-        "       main_card.dspriem, "
-        "       main_card.id_dvig, "
-        "       main_card.id_otkaz, "
-        "       inpatient_department.short, "
-        "       doctor.last_name "
-        "           || ' ' || doctor.first_name "
-        "           || ' ' || doctor.middle_name "
-        "FROM main_card "
-        "   LEFT JOIN pacient patient ON main_card.id_pac = patient.id "
-        "   LEFT JOIN priemnic department "
-        "       ON main_card.id_priem = department.id "
-        "   LEFT JOIN priemnic inpatient_department "
-        "       ON main_card.id_gotd = inpatient_department.id "
-        "   LEFT JOIN doctor ON main_card.amb_doc_id = doctor.doctor_id "
-        "WHERE "
-        "   main_card.id_pac = ? "
-        "ORDER BY main_card.id"
-    )
-    patients_data = fb_select_data(select_query, [patient_id])
+HISTORY_CACHE_TIME = int(os.getenv('HISTORY_CACHE_TIME', 600))
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', 256))
+HISTORY_CACHE = AsyncCache('history', HISTORY_CACHE_TIME,
+                           max_size=HISTORY_CACHE_SIZE)
+
+
+async def load_history(patient_id: int) -> List[Patient]:
+    select_query = build_admissions_query("main_card.id_pac = ?",
+                                          "history")
+    patients_data = await async_fb_fetch_data(select_query, [patient_id])
     history = list()
     for patient_data in patients_data:
         history.append(Patient(*patient_data))
     return history
 
 
+async def get_history(patient_id: int) -> List[Patient]:
+    try:
+        return await HISTORY_CACHE.get(patient_id,
+                                       lambda: load_history(patient_id))
+    except Exception as error:
+        logging.error(f'get_history: {error}')
+        return []
+
+
 async def show_history(update: Update,
                        context: ContextTypes.DEFAULT_TYPE) -> None:
     patient_id = int(update.callback_query.data.split()[-1])
-    history = get_history(patient_id)
+    history = await get_history(patient_id)
     message_header = ('ВСЕ ОБРАЩЕНИЯ ПАЦИЕНТА\n'
                       '===========================\n'
                       f'Ф.И.О.: {history[0].get_full_name()}\n'
                       f'Дата рождения: {history[0].get_birthday()} '
                       f'[{history[0].get_age()}]\n')
-    message_text = message_header
-    message_list = list()
+    history_blocks = list()
     inpatient = 0
     outpatient = 0
     self_denial = 0
@@ -89,13 +80,8 @@ async def show_history(update: Update,
             unreason_directed += 1
         if patient.is_reanimation():
             reanimation_holes += 1
-        history_info = PatientInfo(patient).get_history_info()
-        if len(message_text + history_info) > MESSAGE_MAX_SIZE:
-            message_list.append(message_text)
-            message_text = history_info
-            continue
-        message_text += history_info
-    message_list.append(message_text)
+        history_blocks.append(get_patient_info(patient, 'history'))
+    message_list = list(chunk_messages(history_blocks, message_header))
     message_footer = (
         '===========================\n'
         f'[{history[0].get_full_name()}]\n'
@@ -109,7 +95,7 @@ async def show_history(update: Update,
     )
     message_list.append(message_footer)
     chat_id = update.callback_query.message.chat_id
-    to_delete = ToDelete(chat_id=chat_id)
+    to_delete = await ToDelete.create(chat_id)
     button_list = [
         InlineKeyboardButton(
             'Удалить историю обращений',
@@ -118,16 +104,16 @@ async def show_history(update: Update,
     reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
     for message_text in message_list[:-1]:
         to_delete.add(
-            await context.bot.send_message(chat_id,
-                                           message_text,
-                                           reply_markup=ReplyKeyboardRemove(),
-                                           parse_mode=ParseMode.HTML)
+            await send_chat_message(context.bot, chat_id,
+                                    message_text,
+                                    reply_markup=ReplyKeyboardRemove(),
+                                    parse_mode=ParseMode.HTML)
         )
     else:
         to_delete.add(
-            await context.bot.send_message(chat_id,
-                                           message_list[-1],
-                                           reply_markup=reply_markup,
-                                           parse_mode=ParseMode.HTML)
+            await send_chat_message(context.bot, chat_id,
+                                    message_list[-1],
+                                    reply_markup=reply_markup,
+                                    parse_mode=ParseMode.HTML)
         )
-    to_delete.save()
+    await to_delete.save()
@@ -5,18 +5,18 @@ from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
 from telegram.constants import ParseMode
 
 from callbacks.summary import get_summary
-from classes.patients import PatientInfo
+from classes.patients import get_patient_info
 from classes.to_delete import ToDelete
 from classes.users import get_user
 from utils import (build_menu, delete_calling_message, get_diary_today,
-                   private_access)
+                   get_history_markup, private_access, reply_message)
 
 
 async def show_inpatients(update: Update, start_date: date) -> None:
     chat_id = update.message.chat_id
-    to_delete = ToDelete(chat_id=chat_id)
-    user = get_user(chat_id)
-    patients = get_summary(start_date, user)
+    to_delete = await ToDelete.create(chat_id)
+    user = await get_user(chat_id)
+    patients = await get_summary(start_date, user)
     inpatients = list()
     for patient in patients:
         if patient.is_inpatient_own(user):
@@ -26,8 +26,8 @@ async def show_inpatients(update: Update, start_date: date) -> None:
         f'ГОСПИТАЛИЗИРОВАНО [{user.get_admission_department().upper()}]:\n'
     )
     to_delete.add(
-        await update.message.reply_text(message_header,
-                                        reply_markup=ReplyKeyboardRemove())
+        await reply_message(update.message, message_header,
+                            reply_markup=ReplyKeyboardRemove())
     )
     inpatients_own = 0
     inpatients_from_other = 0
@@ -39,19 +39,12 @@ async def show_inpatients(update: Update, start_date: date) -> None:
             inpatients_own += 1
         else:
             inpatients_from_other += 1
-        patient_info = PatientInfo(patient).get_full_info()
-        button_list = [
-            InlineKeyboardButton(
-                'Показать прошлые обращения',
-                callback_data=f'history {patient.patient_id}')
-        ]
-        reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
-        if not patient.get_full_name().strip():
-            reply_markup = None
+        patient_info = get_patient_info(patient, 'full')
+        reply_markup = get_history_markup(patient)
         to_delete.add(
-            await update.message.reply_text(patient_info,
-                                            reply_markup=reply_markup,
-                                            parse_mode=ParseMode.HTML)
+            await reply_message(update.message, patient_info,
+                                reply_markup=reply_markup,
+                                parse_mode=ParseMode.HTML)
         )
     message_footer = ('===========================\n'
                       f'ВСЕГО ГОСПИТАЛИЗИРОВАНО: {len(inpatients)}\n'
@@ -65,10 +58,10 @@ async def show_inpatients(update: Update, start_date: date) -> None:
     ]
     reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
     to_delete.add(
-        await update.message.reply_text(message_footer,
-                                        reply_markup=reply_markup)
+        await reply_message(update.message, message_footer,
+                            reply_markup=reply_markup)
     )
-    to_delete.save()
+    await to_delete.save()
 
 
 @delete_calling_message
@@ -5,7 +5,8 @@ from telegram.ext import ContextTypes
 
 from classes.users import set_notification_level
 from constants import NOTIFICATION_DESCRIPTIONS, NOTIFICATION_TITLES
-from utils import build_menu, delete_calling_message, private_access
+from utils import (build_menu, delete_calling_message, private_access,
+                   reply_message, send_chat_message)
 
 
 @delete_calling_message
@@ -19,8 +20,8 @@ async def choose_notifications(update: Update, _) -> None:
                 callback_data=f'notification {notification_level}')
         )
     reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
-    await update.message.reply_text(text='ВЫБЕРИТЕ УРОВЕНЬ УВЕДОМЛЕНИЙ:\n',
-                                    reply_markup=reply_markup)
+    await reply_message(update.message, text='ВЫБЕРИТЕ УРОВЕНЬ УВЕДОМЛЕНИЙ:\n',
+                        reply_markup=reply_markup)
 
 
 @delete_calling_message
@@ -28,8 +29,9 @@ async def change_notifications(update: Update,
                                context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.callback_query.message.chat_id
     level = int(update.callback_query.data.split()[-1])
-    if set_notification_level(chat_id, level):
-        await context.bot.send_message(
+    if await set_notification_level(chat_id, level):
+        await send_chat_message(
+            context.bot,
             chat_id,
             'Установлен уровень уведомлений:\n'
             f'[{NOTIFICATION_TITLES[level]}]\n\n'
@@ -38,7 +40,8 @@ async def change_notifications(update: Update,
         logging.info(f'User with CHAT_ID={chat_id} '
                      f'changed notification to {level}')
         return
-    await context.bot.send_message(
+    await send_chat_message(
+        context.bot,
         chat_id,
         'Не удалось изменить уровень уведомлений, попробуйте позже'
     )
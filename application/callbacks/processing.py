@@ -1,66 +1,57 @@
+import os
 from datetime import datetime, timedelta
 from typing import List
 
+from dotenv import load_dotenv
 from telegram import Update
 
-from classes.patients import Patient, PatientInfo
+from classes.admissions import ADMISSIONS
+from classes.cache import AsyncCache
+from classes.patients import Patient, get_patient_info
+from classes.tracing import traced
 from classes.users import User, get_user
-from constants import MESSAGE_MAX_SIZE, STATUS_PROCESSING
-from databases.firebird_db import fb_select_data
-from utils import (delete_calling_message, get_diary_today, private_access,
-                   send_message_list)
+from constants import STATUS_PROCESSING
+from databases.firebird_db import async_fb_select_data
+from databases.queries import build_admissions_query
+from utils import (chunk_messages, delete_calling_message, get_diary_today,
+                   private_access, send_message_list)
 
+load_dotenv()
 
-def get_processing_patients_all() -> List[Patient]:
+PROCESSING_CACHE_TIME = int(os.getenv('PROCESSING_CACHE_TIME', 20))
+PROCESSING_CACHE = AsyncCache('processing', PROCESSING_CACHE_TIME, max_size=1)
+
+
+def get_processing_start() -> datetime:
     start_date = get_diary_today()
     start_datetime = datetime(year=start_date.year,
                               month=start_date.month,
                               day=start_date.day,
                               hour=8,
                               minute=0)
-    reanimation_time = ((datetime.now() - timedelta(hours=2, minutes=30))
-                        .replace(microsecond=0))
-    select_query = (
-        "SELECT main_card.id_pac, "
-        "       main_card.id, "
-        "       main_card.d_in, "
-        "       main_card.d_out, "
-        "       patient.fm, "
-        "       patient.im, "
-        "       patient.ot, "
-        "       patient.dtr, "
-        "       patient.pol, "
-        "       department.short, "
-        "       main_card.remzal, "
-        "       main_card.dsnapr, "
-        "       main_card.dspriem, "
-        "       main_card.id_dvig, "
-        "       main_card.id_otkaz, "
-        "       inpatient_department.short, "
-        "       doctor.last_name "
-        "           || ' ' || doctor.first_name "
-        "           || ' ' || doctor.middle_name "
-        "FROM main_card "
-        "   LEFT JOIN pacient patient ON main_card.id_pac = patient.id "
-        "   LEFT JOIN priemnic department "
-        "       ON main_card.id_priem = department.id "
-        "   LEFT JOIN priemnic inpatient_department "
-        "       ON main_card.id_gotd = inpatient_department.id "
-        "   LEFT JOIN doctor ON main_card.amb_doc_id = doctor.doctor_id "
-        "WHERE "
-        "   (main_card.d_in >= ?) "
-        "   AND ((main_card.id_dvig = ?) "
-        "       OR ((main_card.remzal <> ?) "
-        "           AND (main_card.d_in >= ?))) "
-        "ORDER BY main_card.id"
+    return start_datetime - timedelta(days=1)
+
+
+def get_reanimation_time() -> datetime:
+    return ((datetime.now() - timedelta(hours=2, minutes=30))
+            .replace(microsecond=0))
+
+
+async def load_processing_patients_all() -> List[Patient]:
+    select_query = build_admissions_query(
+        "(main_card.d_in >= ?) "
+        "AND ((main_card.id_dvig = ?) "
+        "    OR ((main_card.remzal <> ?) "
+        "        AND (main_card.d_in >= ?)))",
+        "processing"
     )
-    patients_data = fb_select_data(
+    patients_data = await async_fb_select_data(
         select_query,
         [
-            start_datetime - timedelta(days=1),
+            get_processing_start(),
             STATUS_PROCESSING,
             'F',
-            reanimation_time
+            get_reanimation_time()
         ]
     )
     patients_all = list()
@@ -69,79 +60,80 @@ def get_processing_patients_all() -> List[Patient]:
     return patients_all
 
 
-def get_processing_info_all() -> List[str]:
-    patients = get_processing_patients_all()
-    message_list = list()
+@traced
+async def get_processing_patients_all() -> List[Patient]:
+    processing_start = get_processing_start()
+    if not ADMISSIONS.covers(processing_start):
+        return await PROCESSING_CACHE.get(get_diary_today(),
+                                          load_processing_patients_all)
+    reanimation_time = get_reanimation_time()
+    return ADMISSIONS.select(
+        lambda patient: (
+            patient.admission_date >= processing_start
+            and (patient.status == STATUS_PROCESSING
+                 or (patient.is_reanimation()
+                     and patient.admission_date >= reanimation_time))
+        )
+    )
+
+
+async def get_processing_info_all() -> List[str]:
+    patients = await get_processing_patients_all()
     message_header = 'СЕЙЧАС ОБСЛЕДУЮТСЯ [ВСЕ ОТДЕЛЕНИЯ]\n'
     message_footer = ('===========================\n'
                       '[ВСЕ ОТДЕЛЕНИЯ]\n'
                       f'ВСЕГО ОБСЛЕДУЮТСЯ: {len(patients)}\n')
-    message_text = message_header
     reanimation_holes = 0
     for patient in patients:
         if patient.is_reanimation():
             reanimation_holes += 1
-        patient_info = PatientInfo(patient).get_admission_info()
-        if len(message_text + patient_info) > MESSAGE_MAX_SIZE:
-            message_list.append(message_text)
-            message_text = patient_info
-            continue
-        message_text += patient_info
-    message_list.append(message_text)
+    message_list = list(chunk_messages(
+        (get_patient_info(patient, 'admission') for patient in patients),
+        message_header
+    ))
     message_footer += f'РЕАНИМАЦИОННЫЕ ЗАЛЫ: {reanimation_holes}'
     message_list.append(message_footer)
     return message_list
 
 
-def get_processing_info_own(user: User) -> List[str]:
-    patients_all = get_processing_patients_all()
+async def get_processing_info_own(user: User) -> List[str]:
+    patients_all = await get_processing_patients_all()
     patients = list()
     for patient in patients_all:
         if patient.is_own(user):
             patients.append(patient)
-    message_list = list()
     message_header = (f'СЕЙЧАС ОБСЛЕДУЮТСЯ '
                       f'[{user.get_admission_department().upper()}]\n')
     message_footer = ('===========================\n'
                       f'[{user.get_admission_department().upper()}]\n'
                       f'ВСЕГО ОБСЛЕДУЮТСЯ: {len(patients)}\n')
-    message_text = message_header
     reanimation_holes = 0
     for patient in patients:
         if patient.is_reanimation():
             reanimation_holes += 1
-        patient_info = PatientInfo(patient).get_admission_info()
-        if len(message_text + patient_info) > MESSAGE_MAX_SIZE:
-            message_list.append(message_text)
-            message_text = patient_info
-            continue
-        message_text += patient_info
-    message_list.append(message_text)
+    message_list = list(chunk_messages(
+        (get_patient_info(patient, 'admission') for patient in patients),
+        message_header
+    ))
     message_footer += f'РЕАНИМАЦИОННЫЕ ЗАЛЫ: {reanimation_holes}'
     message_list.append(message_footer)
     return message_list
 
 
-def get_processing_info_rean() -> List[str]:
-    patients_all = get_processing_patients_all()
+async def get_processing_info_rean() -> List[str]:
+    patients_all = await get_processing_patients_all()
     patients = list()
     for patient in patients_all:
         if patient.is_reanimation():
             patients.append(patient)
-    message_list = list()
     message_header = 'СЕЙЧАС ОБСЛЕДУЮТСЯ [РЕАНИМАЦИОННЫЙ ЗАЛ]\n'
     message_footer = ('===========================\n'
                       '[РЕАНИМАЦИОННЫЙ ЗАЛ]\n'
                       f'ВСЕГО ОБСЛЕДУЮТСЯ: {len(patients)}\n')
-    message_text = message_header
-    for patient in patients:
-        patient_info = PatientInfo(patient).get_admission_info()
-        if len(message_text + patient_info) > MESSAGE_MAX_SIZE:
-            message_list.append(message_text)
-            message_text = patient_info
-            continue
-        message_text += patient_info
-    message_list.append(message_text)
+    message_list = list(chunk_messages(
+        (get_patient_info(patient, 'admission') for patient in patients),
+        message_header
+    ))
     message_list.append(message_footer)
     return message_list
 
@@ -157,20 +149,20 @@ async def show_processing(update: Update, message_list: List[str]) -> None:
 @delete_calling_message
 @private_access
 async def show_processing_all(update: Update, _) -> None:
-    message_list = get_processing_info_all()
+    message_list = await get_processing_info_all()
     await show_processing(update, message_list)
 
 
 @delete_calling_message
 @private_access
 async def show_processing_own(update: Update, _) -> None:
-    user = get_user(update.message.chat_id)
-    message_list = get_processing_info_own(user)
+    user = await get_user(update.message.chat_id)
+    message_list = await get_processing_info_own(user)
     await show_processing(update, message_list)
 
 
 @delete_calling_message
 @private_access
 async def show_processing_rean(update: Update, _) -> None:
-    message_list = get_processing_info_rean()
+    message_list = await get_processing_info_rean()
     await show_processing(update, message_list)
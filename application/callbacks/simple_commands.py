@@ -4,7 +4,8 @@ from telegram.ext import ContextTypes
 from classes.to_delete import ToDelete
 from classes.users import get_user
 from constants import NOTIFICATION_TITLES
-from utils import delete_calling_message, private_access, send_message_all
+from utils import (delete_calling_message, private_access, reply_message,
+                   send_message_all)
 
 
 @delete_calling_message
@@ -19,8 +20,9 @@ async def send_all(update: Update,
 @private_access
 async def show_settings(update: Update, _) -> None:
     chat_id = update.message.chat_id
-    user = get_user(chat_id)
-    await update.message.reply_text(
+    user = await get_user(chat_id)
+    await reply_message(
+        update.message,
         'ТЕКУЩИЕ НАСТРОЙКИ\n\n'
         f'Уведомления: [{NOTIFICATION_TITLES[user.notification_level]}]\n'
         f'Отделение: [{user.department}]\n'
@@ -30,5 +32,6 @@ async def show_settings(update: Update, _) -> None:
 async def delete_messages(update: Update,
                           context: ContextTypes.DEFAULT_TYPE) -> None:
     to_delete_id = int(update.callback_query.data.split()[-1])
-    to_delete = ToDelete(to_delete_id=to_delete_id)
-    await to_delete.final_delete(context.bot)
+    to_delete = await ToDelete.get(to_delete_id)
+    if to_delete:
+        await to_delete.final_delete(context.bot)
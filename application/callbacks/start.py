@@ -5,25 +5,25 @@ from telegram import (InlineKeyboardButton, InlineKeyboardMarkup,
                       ReplyKeyboardMarkup, ReplyKeyboardRemove, Update)
 from telegram.ext import ContextTypes, ConversationHandler
 
-from classes.users import (User, get_departments, get_user, get_users,
-                           insert_user, set_enable)
+from classes.users import (User, get_departments, get_user, insert_user,
+                           set_enable)
 from constants import DEPARTMENT, FAMILY, NAME, PHONE, SURNAME
-from utils import (build_menu, delete_calling_message, send_message,
-                   send_message_admin)
+from utils import (build_menu, delete_calling_message, reply_message,
+                   send_message, send_message_admin)
 
 NEW_USERS = dict()
 
 
 async def start(update: Update, _) -> int:
     chat_id = update.message.chat_id
-    users = get_users()
-    for user in users:
-        if user.chat_id == chat_id:
-            await update.message.reply_text(
-                f'Здравствуйте, {user.get_full_name()}!'
-            )
-            return ConversationHandler.END
-    await update.message.reply_text('Введите ВАШУ фамилию:')
+    user = await get_user(chat_id)
+    if user:
+        await reply_message(
+            update.message,
+            f'Здравствуйте, {user.get_full_name()}!'
+        )
+        return ConversationHandler.END
+    await reply_message(update.message, 'Введите ВАШУ фамилию:')
     return FAMILY
 
 
@@ -33,7 +33,8 @@ async def start_family(update: Update, _):
     message = update.message.text
     pattern = re.compile(r'^[А-Я][А-Яа-я \-]*$')
     if not pattern.match(message):
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Допускается использование только '
             'букв русского алфавита, дефиса и пробела. '
             'Начинаться фамилия должна с заглавной буквы.\n'
@@ -45,7 +46,7 @@ async def start_family(update: Update, _):
     NEW_USERS[chat_id]['telegram_full_name'] = user.full_name
     logging.info(f'Somebody <{user.full_name}> with CHAT_ID={chat_id} '
                  f'entered family: {message}')
-    await update.message.reply_text('Отлично. Введите своё имя:')
+    await reply_message(update.message, 'Отлично. Введите своё имя:')
     return NAME
 
 
@@ -55,7 +56,8 @@ async def start_name(update: Update, _):
     message = update.message.text
     pattern = re.compile(r'^[А-Я][А-Яа-я \-]*$')
     if not pattern.match(message):
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Допускается использование только '
             'букв русского алфавита, дефиса и пробела. '
             'Начинаться имя должно с заглавной буквы.\n'
@@ -65,7 +67,7 @@ async def start_name(update: Update, _):
     NEW_USERS[chat_id]['name'] = message
     logging.info(f'Somebody <{user.full_name}> with CHAT_ID={chat_id} '
                  f'entered name: {message}')
-    await update.message.reply_text('Введите своё отчество:')
+    await reply_message(update.message, 'Введите своё отчество:')
     return SURNAME
 
 
@@ -75,7 +77,8 @@ async def start_surname(update: Update, _):
     message = update.message.text
     pattern = re.compile(r'^[А-Я][А-Яа-я \-]*$')
     if not pattern.match(message):
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Допускается использование только '
             'букв русского алфавита, дефиса и пробела. '
             'Начинаться отчество должно с заглавной буквы.\n'
@@ -85,8 +88,8 @@ async def start_surname(update: Update, _):
     NEW_USERS[chat_id]['surname'] = message
     logging.info(f'Somebody <{user.full_name}> with CHAT_ID={chat_id} '
                  f'entered surname: {message}')
-    await update.message.reply_text('Введите ваш телефонный номер '
-                                    'в формате: +7XXXXXXXXXX')
+    await reply_message(update.message, 'Введите ваш телефонный номер '
+                        'в формате: +7XXXXXXXXXX')
     return PHONE
 
 
@@ -96,7 +99,8 @@ async def start_phone(update: Update, _):
     message = update.message.text
     pattern = re.compile(r'^\+7\d{10}$')
     if not pattern.match(message):
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Введите номер телефона в формате: +7XXXXXXXXXX\n'
             'Например: +71234567890\n'
             'Попробуйте ещё раз:'
@@ -105,7 +109,7 @@ async def start_phone(update: Update, _):
     NEW_USERS[chat_id]['phone'] = message
     logging.info(f'Somebody <{user.full_name}> with CHAT_ID={chat_id} '
                  f'entered phone: {message}')
-    departments = get_departments()
+    departments = await get_departments()
     button_list = list()
     for department_name in departments.values():
         button_list.append(
@@ -113,8 +117,8 @@ async def start_phone(update: Update, _):
         )
     reply_markup = ReplyKeyboardMarkup(build_menu(button_list, n_cols=2),
                                        resize_keyboard=True)
-    await update.message.reply_text('Выберите ваше отделение:\n',
-                                    reply_markup=reply_markup)
+    await reply_message(update.message, 'Выберите ваше отделение:\n',
+                        reply_markup=reply_markup)
     return DEPARTMENT
 
 
@@ -123,9 +127,10 @@ async def start_department(update: Update,
     chat_id = update.message.chat_id
     user = update.message.from_user
     message = update.message.text
-    departments = get_departments()
+    departments = await get_departments()
     if message not in departments.values():
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Выберите ваше отделение из списка, который ниже:\n'
         )
         return DEPARTMENT
@@ -142,7 +147,7 @@ async def start_department(update: Update,
                 phone=user_data['phone'],
                 chat_id=chat_id,
                 telegram_full_name=user_data['telegram_full_name'])
-    if insert_user(user):
+    if await insert_user(user):
         button_list = [
             InlineKeyboardButton(
                 'Активировать',
@@ -161,13 +166,15 @@ async def start_department(update: Update,
             reply_markup=reply_markup
         )
     else:
-        await update.message.reply_text(
+        await reply_message(
+            update.message,
             'Не удалось добавить вашу учетную запись, попробуйте позже '
             'или свяжитесь с администратором.',
             reply_markup=ReplyKeyboardRemove()
         )
         return ConversationHandler.END
-    await update.message.reply_text(
+    await reply_message(
+        update.message,
         'Отлично, ваши данные направлены администратору.\n'
         'Когда ваша учетная запись будет активирована, придёт уведомление.\n\n'
         'Если вы заранее не договаривались, то попросите того, '
@@ -182,8 +189,8 @@ async def start_department(update: Update,
 async def activate_user(update: Update,
                         context: ContextTypes.DEFAULT_TYPE) -> None:
     user_chat_id = int(update.callback_query.data.split()[-1])
-    user = get_user(user_chat_id)
-    if set_enable(user_chat_id):
+    user = await get_user(user_chat_id)
+    if await set_enable(user_chat_id):
         await send_message_admin(
             context.bot,
             'ПОЛЬЗОВАТЕЛЬ АКТИВИРОВАН\n'
@@ -1,111 +1,129 @@
-import re
 from datetime import date, datetime, timedelta
-from typing import List
+from typing import AsyncIterator, List
 
 from telegram import Update
 
 from callbacks.processing import get_processing_patients_all
-from classes.patients import Patient, PatientInfo
+from classes.admissions import ADMISSIONS
+from classes.departments import get_department
+from classes.patients import Patient, get_patient_info
+from classes.tracing import traced
 from classes.users import User, get_user
-from constants import MESSAGE_MAX_SIZE
-from notifier import fb_select_data
-from utils import (delete_calling_message, get_diary_today, private_access,
-                   send_message_list)
+from constants import STATUS_PROCESSING
+from databases.firebird_db import async_fb_iter_data
+from databases.queries import build_admissions_query
+from utils import (MessageChunker, delete_calling_message, get_diary_today,
+                   private_access, send_message_list)
 
 
-def get_summary(start_date: date, user: User) -> List[Patient]:
+@traced
+async def load_summary(start_datetime: datetime,
+                       end_datetime: datetime,
+                       user: User) -> AsyncIterator[Patient]:
+    department = get_department(user.department)
+    department_condition = '= ?'
+    department_parameter = department.name
+    if department.is_group():
+        department_condition = 'LIKE ?'
+        department_parameter = f'% {department.group}'
+    select_query = build_admissions_query(
+        "(main_card.d_in >= ?) "
+        "AND (main_card.d_in < ?) "
+        f"AND ((department.short {department_condition}) "
+        f"    OR (inpatient_department.short {department_condition})) "
+        "AND (((main_card.d_in >= ?) "
+        "        AND (main_card.id_dvig <> ?) "
+        "        AND (main_card.d_out < ?)) "
+        "    OR ((main_card.d_in < ?) "
+        "        AND ((main_card.id_dvig = ?) "
+        "            OR (main_card.d_out >= ?))))",
+        "summary"
+    )
+    async for patient_data in async_fb_iter_data(
+        select_query,
+        [
+            start_datetime - timedelta(days=1),
+            end_datetime,
+            department_parameter,
+            department_parameter,
+            start_datetime,
+            STATUS_PROCESSING,
+            end_datetime,
+            start_datetime,
+            STATUS_PROCESSING,
+            start_datetime
+        ]
+    ):
+        yield Patient(*patient_data)
+
+
+def is_summary_patient(patient: Patient,
+                       start_datetime: datetime,
+                       end_datetime: datetime) -> bool:
+    if (patient.admission_date >= start_datetime
+            and (patient.is_outcome()
+                 and patient.admission_outcome_date < end_datetime)):
+        return True
+    return (patient.admission_date < start_datetime
+            and ((not patient.is_outcome())
+                 or patient.admission_outcome_date >= start_datetime))
+
+
+@traced
+async def iter_summary(start_date: date,
+                       user: User) -> AsyncIterator[Patient]:
     start_datetime = datetime(year=start_date.year,
                               month=start_date.month,
                               day=start_date.day,
                               hour=8,
                               minute=0)
     end_datetime = start_datetime + timedelta(days=1)
-    query_department_arg = f"= '{user.department}'"
-    pattern_surgery = re.compile(r'^.* ХИРУРГИЯ$')
-    pattern_therapy = re.compile(r'^.* ТЕРАПИЯ$')
-    if pattern_surgery.match(user.department):
-        user_department = 'ХИРУРГИЯ'
-        query_department_arg = f"LIKE '% {user_department}'"
-    if pattern_therapy.match(user.department):
-        user_department = 'ТЕРАПИЯ'
-        query_department_arg = f"LIKE '% {user_department}'"
-    select_query = (
-        "SELECT main_card.id_pac, "
-        "       main_card.id, "
-        "       main_card.d_in, "
-        "       main_card.d_out, "
-        "       patient.fm, "
-        "       patient.im, "
-        "       patient.ot, "
-        "       patient.dtr, "
-        "       patient.pol, "
-        "       department.short, "
-        "       main_card.remzal, "
-        "       main_card.dsnapr, "
-        "       main_card.dspriem, "
-        "       main_card.id_dvig, "
-        "       main_card.id_otkaz, "
-        "       inpatient_department.short, "
-        "       doctor.last_name "
-        "           || ' ' || doctor.first_name "
-        "           || ' ' || doctor.middle_name "
-        "FROM main_card "
-        "   LEFT JOIN pacient patient ON main_card.id_pac = patient.id "
-        "   LEFT JOIN priemnic department "
-        "       ON main_card.id_priem = department.id "
-        "   LEFT JOIN priemnic inpatient_department "
-        "       ON main_card.id_gotd = inpatient_department.id "
-        "   LEFT JOIN doctor ON main_card.amb_doc_id = doctor.doctor_id "
-        "WHERE "
-        f"  ((department.short {query_department_arg}) "
-        f"      OR (inpatient_department.short {query_department_arg})) "
-        "   AND (main_card.d_in >= ?) "
-        "   AND (main_card.d_in < ?) "
-        "ORDER BY main_card.id"
-    )
-    patients_data = fb_select_data(
-        select_query,
-        [
-            start_datetime - timedelta(days=1),
-            end_datetime
-        ]
-    )
-    unsorted_patients = list()
-    for patient_data in patients_data:
-        unsorted_patients.append(Patient(*patient_data))
-    patients = list()
-    for patient in unsorted_patients:
-        if (patient.admission_date >= start_datetime
-                and (patient.is_outcome()
-                     and patient.admission_outcome_date < end_datetime)):
-            patients.append(patient)
-        elif (patient.admission_date < start_datetime
-              and ((not patient.is_outcome())
-                   or patient.admission_outcome_date >= start_datetime)):
-            patients.append(patient)
-    return patients
-
-
-def gen_summary_messages(start_date: date,  # noqa: C901
-                         user: User) -> List[str]:
-    patients = get_summary(start_date, user)
+    summary_start = start_datetime - timedelta(days=1)
+    if ADMISSIONS.covers(summary_start):
+        for patient in ADMISSIONS.select(
+            lambda patient: (
+                summary_start <= patient.admission_date < end_datetime
+                and (patient.is_own(user) or patient.is_inpatient_own(user))
+                and is_summary_patient(patient, start_datetime, end_datetime)
+            )
+        ):
+            yield patient
+        return
+    async for patient in load_summary(start_datetime, end_datetime, user):
+        yield patient
+
+
+@traced
+async def get_summary(start_date: date, user: User) -> List[Patient]:
+    return [patient async for patient in iter_summary(start_date, user)]
+
+
+@traced
+async def gen_summary_messages(start_date: date,  # noqa: C901
+                               user: User) -> AsyncIterator[str]:
     patients_processing = list()
     if start_date == get_diary_today():
-        for patient in get_processing_patients_all():
+        for patient in await get_processing_patients_all():
             if patient.is_own(user) and (not patient.is_reanimation()):
                 patients_processing.append(patient)
-    patients_amount = len(patients)
     patients_processing_amount = len(patients_processing)
-    patients.extend(patients_processing)
-    message_list = list()
+
+    async def iter_patients() -> AsyncIterator[Patient]:
+        async for patient in iter_summary(start_date, user):
+            yield patient
+        for patient in patients_processing:
+            yield patient
+
     message_header = (f'ЗА {start_date.strftime("%d.%m.%Y")} ОБРАТИЛИСЬ '
                       f'[{user.get_admission_department().upper()}]:\n')
-    message_text = message_header
+    chunker = MessageChunker(message_header)
+    patients_amount = -patients_processing_amount
     inpatients_own = 0
     inpatients_other = 0
     inpatients_from_other = 0
     reanimation_holes = 0
-    for patient in patients:
+    async for patient in iter_patients():
+        patients_amount += 1
         if patient.is_reanimation():
             reanimation_holes += 1
         if patient.is_inpatient():
@@ -115,13 +133,11 @@ def gen_summary_messages(start_date: date,  # noqa: C901
                 inpatients_from_other += 1
             else:
                 inpatients_other += 1
-        patient_info = PatientInfo(patient).get_full_info()
-        if len(message_text + patient_info) > MESSAGE_MAX_SIZE:
-            message_list.append(message_text)
-            message_text = patient_info
-            continue
-        message_text += patient_info
-    message_list.append(message_text)
+        patient_info = get_patient_info(patient, 'full')
+        for message_text in chunker.add(patient_info):
+            yield message_text
+    for message_text in chunker.flush():
+        yield message_text
     patients_processing_amount_str = '\n'
     if start_date == get_diary_today():
         patients_processing_amount_str = (f' + {patients_processing_amount} '
@@ -134,17 +150,15 @@ def gen_summary_messages(start_date: date,  # noqa: C901
                       f'ГОСПИТАЛИЗАЦИИ ОТ ДРУГИХ: {inpatients_from_other}\n'
                       f'ГОСПИТАЛИЗАЦИИ К ДРУГИМ: {inpatients_other}\n'
                       f'РЕАНИМАЦИОННЫЕ ЗАЛЫ: {reanimation_holes}\n')
-    message_list.append(message_footer)
-    return message_list
+    yield message_footer
 
 
 async def show_summary(update: Update, start_date: date) -> None:
     chat_id = update.message.chat_id
-    user = get_user(chat_id)
-    message_list = gen_summary_messages(start_date, user)
+    user = await get_user(chat_id)
     await send_message_list(
         update,
-        message_list,
+        gen_summary_messages(start_date, user),
         'Удалить сводку'
     )
 
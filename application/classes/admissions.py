@@ -0,0 +1,85 @@
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Union
+
+from dotenv import load_dotenv
+
+from classes.patients import Patient
+from databases.firebird_db import async_fb_select_data
+from databases.queries import build_admissions_query
+
+load_dotenv()
+
+ADMISSIONS_WINDOW_HOURS = int(os.getenv('ADMISSIONS_WINDOW_HOURS', 48))
+ADMISSIONS_RESYNC_TIME = int(os.getenv('ADMISSIONS_RESYNC_TIME', 120))
+ADMISSIONS_STALE_TIME = int(os.getenv('ADMISSIONS_STALE_TIME', 180))
+
+
+class AdmissionsWindow:
+    def __init__(self, window_hours: int, stale_time: int):
+        self.window = timedelta(hours=window_hours)
+        self.stale_time = stale_time
+        self.patients: Dict[int, Patient] = dict()
+        self.added: Union[Dict[int, Patient], None] = None
+        self.synced_from: Union[datetime, None] = None
+        self.updated = 0.0
+
+    def is_enabled(self) -> bool:
+        return bool(self.window)
+
+    def is_ready(self) -> bool:
+        return (self.synced_from is not None
+                and time.monotonic() - self.updated < self.stale_time)
+
+    def covers(self, since: datetime) -> bool:
+        return self.is_ready() and since >= self.synced_from
+
+    async def resync(self) -> None:
+        since = datetime.now() - self.window
+        select_query = build_admissions_query("main_card.d_in >= ?",
+                                              "admissions_window")
+        self.added = dict()
+        try:
+            patients_data = await async_fb_select_data(select_query,
+                                                       [since])
+        finally:
+            added, self.added = self.added, None
+        if not patients_data:
+            logging.warning('AdmissionsWindow.resync: no data')
+            return
+        self.patients = dict()
+        for patient_data in patients_data:
+            patient = Patient(*patient_data)
+            self.patients[patient.card_id] = patient
+        self.patients.update(added)
+        self.synced_from = since
+        self.updated = time.monotonic()
+        logging.info('AdmissionsWindow.resync: '
+                     f'{len(self.patients)} cards since {since}')
+
+    def add(self, patients: List[Patient]) -> None:
+        if self.added is not None:
+            for patient in patients:
+                self.added[patient.card_id] = patient
+        if self.synced_from is None:
+            return
+        for patient in patients:
+            self.patients[patient.card_id] = patient
+        since = datetime.now() - self.window
+        for card_id in [card_id
+                        for card_id, patient in self.patients.items()
+                        if patient.admission_date < since]:
+            del self.patients[card_id]
+        self.synced_from = max(self.synced_from, since)
+
+    def select(self,
+               condition: Callable[[Patient], bool]) -> List[Patient]:
+        return [patient
+                for card_id, patient in sorted(self.patients.items())
+                if condition(patient)]
+
+
+ADMISSIONS = AdmissionsWindow(ADMISSIONS_WINDOW_HOURS,
+                              ADMISSIONS_STALE_TIME)
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from classes.metrics import Gauge
+
+CACHES: List['AsyncCache'] = list()
+
+
+class AsyncCache:
+    def __init__(self, name: str, ttl: float, max_size: int = 128):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self.values: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+        self.loading: Dict[Hashable, asyncio.Future] = dict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        CACHES.append(self)
+
+    async def get(self,
+                  key: Hashable,
+                  loader: Callable[[], Awaitable[Any]]) -> Any:
+        item = self.values.get(key)
+        if item and item[0] > time.monotonic():
+            self.hits += 1
+            self.values.move_to_end(key)
+            return item[1]
+        future = self.loading.get(key)
+        if future:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+        self.misses += 1
+        generation = self.generation
+        future = asyncio.get_running_loop().create_future()
+        self.loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()
+            raise
+        finally:
+            del self.loading[key]
+        future.set_result(value)
+        if generation == self.generation:
+            self.values[key] = (time.monotonic() + self.ttl, value)
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_size:
+                self.values.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Hashable = None) -> None:
+        self.generation += 1
+        if key is None:
+            self.values.clear()
+            return
+        self.values.pop(key, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self.values),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+        }
+
+
+def collect_cache_lookups() -> Dict[Tuple[str, str], int]:
+    lookups = dict()
+    for cache in CACHES:
+        for result in ('hits', 'misses', 'coalesced'):
+            lookups[(cache.name, result)] = getattr(cache, result)
+    return lookups
+
+
+def collect_cache_hit_ratios() -> Dict[Tuple[str], float]:
+    ratios = dict()
+    for cache in CACHES:
+        total = cache.hits + cache.misses + cache.coalesced
+        ratios[(cache.name,)] = (cache.hits + cache.coalesced) / total \
+            if total else 0.0
+    return ratios
+
+
+CACHE_LOOKUPS = Gauge('cache_lookups',
+                      'Cache lookups by result.',
+                      ('cache', 'result'),
+                      collect=collect_cache_lookups)
+CACHE_HIT_RATIO = Gauge('cache_hit_ratio',
+                        'Share of cache lookups served without a new load.',
+                        ('cache',),
+                        collect=collect_cache_hit_ratios)
@@ -0,0 +1,51 @@
+import re
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Tuple, Union
+
+SURGERY = 'ХИРУРГИЯ'
+THERAPY = 'ТЕРАПИЯ'
+CARDIOLOGY = 'КАРДИОЛОГИЯ'
+CARDIOLOGY2 = '2 Кардиология'
+NEUROLOGY = 'НЕВРОЛОГИЯ'
+
+PATTERN_SURGERY = re.compile(r'^.* ХИРУРГИЯ$')
+PATTERN_THERAPY = re.compile(r'^.* ТЕРАПИЯ$')
+
+
+@dataclass(frozen=True)
+class Department:
+    name: Union[str, None]
+    group: Union[str, None]
+    kind: str
+    key: Tuple[str, Union[str, None]]
+
+    def is_therapy(self) -> bool:
+        return self.kind == 'therapy'
+
+    def is_group(self) -> bool:
+        return self.key[0] == 'group'
+
+    def is_vascular_center(self) -> bool:
+        return self.name in (CARDIOLOGY, NEUROLOGY)
+
+    def is_cardiology2(self) -> bool:
+        return self.name == CARDIOLOGY2
+
+
+@lru_cache(maxsize=None)
+def get_department(name: Union[str, None]) -> Department:
+    if name is not None:
+        name = sys.intern(name)
+    if name and PATTERN_SURGERY.match(name):
+        return Department(name, SURGERY, 'surgery', ('group', SURGERY))
+    if name and PATTERN_THERAPY.match(name):
+        return Department(name, THERAPY, 'therapy', ('group', THERAPY))
+    if name in (CARDIOLOGY, CARDIOLOGY2):
+        kind = 'cardiology'
+    elif name == NEUROLOGY:
+        kind = 'neurology'
+    else:
+        kind = 'other'
+    return Department(name, name, kind, ('department', name))
@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Callable
+
+from databases.firebird_db import connect_fdb, ping_fdb
+
+
+class FBEventListener:
+    def __init__(self,
+                 event_name: str,
+                 callback: Callable[[int], None],
+                 wait_timeout: float = 60,
+                 reconnect_time: float = 30):
+        self.event_name = event_name
+        self.callback = callback
+        self.wait_timeout = wait_timeout
+        self.reconnect_time = reconnect_time
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                       name='fdb-events',
+                                       daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def listen(self, connection) -> None:
+        with connection.event_conduit([self.event_name]) as conduit:
+            logging.info(f'FDB EVENTS: listening for {self.event_name}')
+            while not self.stopped.is_set():
+                events = conduit.wait(self.wait_timeout)
+                count = (events or {}).get(self.event_name, 0)
+                if count:
+                    conduit.flush()
+                    self.callback(count)
+                    continue
+                ping_fdb(connection)
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            connection = connect_fdb()
+            if connection:
+                try:
+                    self.listen(connection)
+                except Exception as error:
+                    logging.error(f'FDB EVENTS: {error}')
+                finally:
+                    try:
+                        connection.close()
+                    except Exception as error:
+                        logging.error(f'FDB CLOSE: {error}')
+            self.stopped.wait(self.reconnect_time)
+
+
+class SimulatedEventListener:
+    def __init__(self,
+                 event_name: str,
+                 callback: Callable[[int], None],
+                 interval: float = 10):
+        self.event_name = event_name
+        self.callback = callback
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                       name='fdb-events-simulated',
+                                       daemon=True)
+
+    def start(self) -> None:
+        logging.info(f'FDB EVENTS: simulating {self.event_name} '
+                     f'every {self.interval}s')
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def fire(self, count: int = 1) -> None:
+        self.callback(count)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.fire()
@@ -0,0 +1,25 @@
+from typing import Union
+
+
+class AdaptiveInterval:
+    def __init__(self,
+                 min_time: float,
+                 max_time: float,
+                 idle_factor: float = 1.5,
+                 error_factor: float = 2):
+        self.min_time = min_time
+        self.max_time = max(max_time, min_time)
+        self.idle_factor = idle_factor
+        self.error_factor = error_factor
+        self.interval = min_time
+
+    def update(self, new_rows: Union[int, None]) -> float:
+        if new_rows is None:
+            self.interval = min(self.max_time,
+                                self.interval * self.error_factor)
+        elif new_rows:
+            self.interval = self.min_time
+        else:
+            self.interval = min(self.max_time,
+                                self.interval * self.idle_factor)
+        return self.interval
@@ -0,0 +1,68 @@
+import logging
+import select
+import threading
+from typing import Callable
+
+from databases.postgresql_db import async_pg_write_transaction, connect_psql
+
+USERS_CHANNEL = 'monitor_bot_users'
+
+
+async def notify_invalidation(channel: str, payload: str = '') -> bool:
+    return await async_pg_write_transaction([('SELECT pg_notify(%s, %s)',
+                                              [channel, payload])],
+                                            name='notify_invalidation')
+
+
+class PGNotifyListener:
+    def __init__(self,
+                 channel: str,
+                 callback: Callable[[str], None],
+                 wait_timeout: float = 60,
+                 reconnect_time: float = 30):
+        self.channel = channel
+        self.callback = callback
+        self.wait_timeout = wait_timeout
+        self.reconnect_time = reconnect_time
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run,
+                                       name='pg-notify',
+                                       daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def listen(self, connection) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        logging.info(f'PG NOTIFY: listening for {self.channel}')
+        self.callback('')
+        while not self.stopped.is_set():
+            ready, _, _ = select.select([connection], [], [],
+                                        self.wait_timeout)
+            if not ready:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                continue
+            connection.poll()
+            while connection.notifies:
+                notify = connection.notifies.pop(0)
+                self.callback(notify.payload)
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            connection = connect_psql(application_name='monitor-bot notify')
+            if connection:
+                try:
+                    self.listen(connection)
+                except Exception as error:
+                    logging.error(f'PG NOTIFY: {error}')
+                finally:
+                    try:
+                        connection.close()
+                    except Exception as error:
+                        logging.error(f'PG CLOSE: {error}')
+            self.stopped.wait(self.reconnect_time)
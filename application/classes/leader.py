@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from databases.postgresql_db import PG_EXECUTOR, connect_psql
+
+load_dotenv()
+
+LEADER_LOCK_ID = int(os.getenv('LEADER_LOCK_ID', 7310001))
+LEADER_CHECK_TIME = float(os.getenv('LEADER_CHECK_TIME', 5))
+LEADER_KEEPALIVE_TIME = int(os.getenv('LEADER_KEEPALIVE_TIME', 5))
+
+
+class LeaderElection:
+    def __init__(self, lock_id: int, keepalive_time: int):
+        self.lock_id = lock_id
+        self.keepalive_time = keepalive_time
+        self.connection = None
+        self.is_leader = False
+        self.lock = threading.Lock()
+
+    def connect(self) -> None:
+        self.connection = connect_psql(
+            keepalives=1,
+            keepalives_idle=self.keepalive_time,
+            keepalives_interval=self.keepalive_time,
+            keepalives_count=2,
+            application_name='monitor-bot leader'
+        )
+
+    def disconnect(self) -> None:
+        self.is_leader = False
+        if self.connection is None:
+            return
+        try:
+            self.connection.close()
+        except Exception as error:
+            logging.error(f'LEADER CLOSE: {error}')
+        self.connection = None
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            if self.connection is None or self.connection.closed:
+                self.disconnect()
+                self.connect()
+                if self.connection is None:
+                    return False
+            try:
+                with self.connection.cursor() as cursor:
+                    if self.is_leader:
+                        cursor.execute('SELECT 1')
+                    else:
+                        cursor.execute('SELECT pg_try_advisory_lock(%s)',
+                                       [self.lock_id])
+                        self.is_leader = cursor.fetchone()[0]
+            except Exception as error:
+                logging.error(f'LEADER CHECK: {error}')
+                self.disconnect()
+            return self.is_leader
+
+    def release(self) -> None:
+        with self.lock:
+            if self.is_leader and self.connection is not None:
+                try:
+                    with self.connection.cursor() as cursor:
+                        cursor.execute('SELECT pg_advisory_unlock(%s)',
+                                       [self.lock_id])
+                except Exception as error:
+                    logging.error(f'LEADER RELEASE: {error}')
+            self.disconnect()
+
+    async def check(self) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(PG_EXECUTOR, self.try_acquire)
+
+
+LEADER = LeaderElection(LEADER_LOCK_ID, LEADER_KEEPALIVE_TIME)
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9464))
+METRICS_PREFIX = 'monitor_bot_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+QUERY_NAME_PATTERNS = (
+    re.compile(r'^\s*(UPDATE)\s+(\w+)', re.IGNORECASE),
+    re.compile(r'^\s*(\w+).*?\b(?:FROM|INTO)\s+(\w+)',
+               re.IGNORECASE | re.DOTALL),
+    re.compile(r'^\s*(SELECT)\s+(\w+)\s*\(', re.IGNORECASE),
+)
+
+METRICS: List['Metric'] = list()
+QUERY_NAMES: Dict[str, str] = dict()
+
+Labels = Tuple[str, ...]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = list()
+    for name, value in zip(names, values):
+        value = (str(value).replace('\\', '\\\\')
+                 .replace('"', '\\"')
+                 .replace('\n', '\\n'))
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def register_query_name(query: str, name: str) -> None:
+    QUERY_NAMES[query] = name
+
+
+def get_query_name(query: str) -> str:
+    name = QUERY_NAMES.get(query)
+    if name:
+        return name
+    for pattern in QUERY_NAME_PATTERNS:
+        match = pattern.match(query)
+        if match:
+            return f'{match.group(1)}_{match.group(2)}'.lower()
+    return 'query'
+
+
+def timed_query(db: str, error_result=None):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(query, *args, name: Union[str, None] = None, **kwargs):
+            if name is None:
+                name = (get_query_name(query) if isinstance(query, str)
+                        else 'transaction')
+            start = time.perf_counter()
+            try:
+                result = function(query, *args, **kwargs)
+            except Exception:
+                DB_QUERY_ERRORS.inc(db=db, query=name)
+                raise
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - start,
+                                         db=db, query=name)
+            if result is error_result:
+                DB_QUERY_ERRORS.inc(db=db, query=name)
+            return result
+        return wrapper
+    return decorator
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        METRICS.append(self)
+
+    def get_labels(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        return iter(())
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = dict()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.get_labels(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield (f'{self.name}{format_labels(self.labelnames, key)} '
+                   f'{format_value(value)}')
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values: Dict[Labels, Tuple[List[int], List[float]]] = dict()
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.get_labels(labels)
+        with self.lock:
+            counts, total = self.values.setdefault(
+                key, ([0] * len(self.buckets), [0.0])
+            )
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self.lock:
+            values = [(key, list(counts), total[0])
+                      for key, (counts, total) in self.values.items()]
+        names = self.labelnames + ('le',)
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(names, key + (format_value(bound),))
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Sequence[str] = (),
+                 collect: Union[Callable[[], Dict[Labels, float]],
+                                None] = None):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Labels, float] = dict()
+        self.collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self.get_labels(labels)] = value
+
+    def samples(self) -> Iterator[str]:
+        if self.collect:
+            try:
+                values = list(self.collect().items())
+            except Exception as error:
+                logging.error(f'METRICS {self.name}: {error}')
+                values = list()
+        else:
+            with self.lock:
+                values = list(self.values.items())
+        for key, value in values:
+            yield (f'{self.name}{format_labels(self.labelnames, key)} '
+                   f'{format_value(value)}')
+
+
+def render_metrics() -> str:
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
+
+
+async def handle_metrics(reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        parts = request_line.split()
+        if len(parts) > 1 and parts[1].split(b'?')[0] == b'/metrics':
+            status = '200 OK'
+            body = render_metrics().encode()
+        else:
+            status = '404 Not Found'
+            body = b'Not Found\n'
+        writer.write(f'HTTP/1.0 {status}\r\n'
+                     'Content-Type: text/plain; version=0.0.4; '
+                     'charset=utf-8\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     'Connection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+    except Exception as error:
+        logging.error(f'METRICS: {error}')
+    finally:
+        writer.close()
+
+
+async def start_metrics_server() -> Union[asyncio.AbstractServer, None]:
+    if not METRICS_PORT:
+        return None
+    server = await asyncio.start_server(handle_metrics,
+                                        METRICS_HOST,
+                                        METRICS_PORT)
+    logging.info(f'METRICS: serving on {METRICS_HOST}:{METRICS_PORT}')
+    return server
+
+
+DB_QUERY_SECONDS = Histogram('db_query_seconds',
+                             'Database query duration in seconds.',
+                             ('db', 'query'))
+DB_QUERY_ERRORS = Counter('db_query_errors_total',
+                          'Failed database queries.',
+                          ('db', 'query'))
+SEND_SECONDS = Histogram('telegram_send_seconds',
+                         'Telegram sendMessage duration in seconds, '
+                         'including rate limiting and retries.')
+SEND_ERRORS = Counter('telegram_send_errors_total',
+                      'Telegram sendMessage errors by error type.',
+                      ('error',))
+SENDER_MESSAGES = Counter('telegram_sender_messages_total',
+                          'Messages handled by the rate-limited sender '
+                          'by result.',
+                          ('result',))
+DETECTION_LAG_SECONDS = Histogram('notifier_detection_lag_seconds',
+                                  'Time from admission to detection '
+                                  'by the notifier in seconds.',
+                                  buckets=LAG_BUCKETS)
+HANDLER_SECONDS = Histogram('handler_seconds',
+                            'Update handling duration in seconds.',
+                            ('command',))
@@ -0,0 +1,129 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import List, Set, Union
+
+from dotenv import load_dotenv
+
+from classes.patients import Patient
+from databases.postgresql_db import (async_pg_select_data,
+                                     async_pg_write_transaction)
+
+load_dotenv()
+
+OUTBOX_TABLE = 'notifier_outbox'
+DELIVERIES_TABLE = 'notifier_deliveries'
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_EXPIRE_TIME = int(os.getenv('OUTBOX_EXPIRE_TIME', 900))
+OUTBOX_KEEP_TIME = int(os.getenv('OUTBOX_KEEP_TIME', 86400))
+DATETIME_FIELDS = ('admission_date', 'admission_outcome_date', 'birthday')
+SET_LAST_ID_QUERY = (
+    "UPDATE variables "
+    "SET value = %s "
+    "WHERE name = 'main_card_last_id'"
+)
+
+
+@dataclass
+class OutboxItem:
+    outbox_id: int
+    expired: bool
+    patient: Patient
+    delivered: Set[int]
+
+
+def dump_patient(patient: Patient) -> str:
+    data = asdict(patient)
+    for name in DATETIME_FIELDS:
+        if data[name]:
+            data[name] = data[name].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def load_patient(data: dict) -> Patient:
+    data = dict(data)
+    for name in DATETIME_FIELDS:
+        if data[name]:
+            data[name] = datetime.fromisoformat(data[name])
+    return Patient(**data)
+
+
+async def enqueue_patients(patients: List[Patient]) -> bool:
+    write_query = (
+        f"INSERT INTO {OUTBOX_TABLE} (card_id, patient) "
+        "VALUES (%s, %s) "
+        "ON CONFLICT (card_id) DO NOTHING"
+    )
+    queries = [(write_query, [patient.card_id, dump_patient(patient)])
+               for patient in patients]
+    queries.append((SET_LAST_ID_QUERY, [patients[-1].card_id]))
+    return await async_pg_write_transaction(queries, name='enqueue_patients')
+
+
+async def get_pending_items() -> Union[List[OutboxItem], None]:
+    select_query = (
+        "SELECT id, created < now() - %s * interval '1 second', patient "
+        f"FROM {OUTBOX_TABLE} "
+        "WHERE NOT delivered "
+        "ORDER BY id "
+        "LIMIT %s"
+    )
+    outbox_data = await async_pg_select_data(select_query,
+                                             [OUTBOX_EXPIRE_TIME,
+                                              OUTBOX_BATCH_SIZE],
+                                             name='get_pending_items')
+    if outbox_data is None:
+        return None
+    items = dict()
+    for outbox_id, expired, patient_data in outbox_data:
+        items[outbox_id] = OutboxItem(outbox_id,
+                                      expired,
+                                      load_patient(patient_data),
+                                      set())
+    if not items:
+        return []
+    select_query = (
+        "SELECT outbox_id, chat_id "
+        f"FROM {DELIVERIES_TABLE} "
+        "WHERE outbox_id = ANY(%s)"
+    )
+    deliveries_data = await async_pg_select_data(select_query,
+                                                 [list(items)],
+                                                 name='get_deliveries')
+    if deliveries_data is None:
+        return None
+    for outbox_id, chat_id in deliveries_data:
+        items[outbox_id].delivered.add(chat_id)
+    return list(items.values())
+
+
+async def complete_item(item: OutboxItem,
+                        chat_ids: List[int],
+                        delivered: bool) -> bool:
+    write_query = (
+        f"INSERT INTO {DELIVERIES_TABLE} (outbox_id, chat_id) "
+        "VALUES (%s, %s) "
+        "ON CONFLICT DO NOTHING"
+    )
+    queries = [(write_query, [item.outbox_id, chat_id])
+               for chat_id in chat_ids]
+    if delivered:
+        queries.append((f"UPDATE {OUTBOX_TABLE} "
+                        "SET delivered = true "
+                        "WHERE id = %s",
+                        [item.outbox_id]))
+    if not queries:
+        return True
+    return await async_pg_write_transaction(queries, name='complete_item')
+
+
+async def purge_outbox() -> bool:
+    delete_query = (
+        f"DELETE FROM {OUTBOX_TABLE} "
+        "WHERE delivered "
+        "  AND created < now() - %s * interval '1 second'"
+    )
+    return await async_pg_write_transaction([(delete_query,
+                                              [OUTBOX_KEEP_TIME])],
+                                            name='purge_outbox')
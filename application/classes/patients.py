@@ -1,11 +1,19 @@
-import re
+import os
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime
+from functools import cached_property, lru_cache
 
+from dotenv import load_dotenv
+
+from classes.departments import get_department
 from classes.users import User
 from constants import (REJECTIONS, STATUS_INPATIENT, STATUS_OUTPATIENT_MAIN,
                        STATUS_PROCESSING, STATUSES)
 
+load_dotenv()
+
+PATIENT_INFO_CACHE_SIZE = int(os.getenv('PATIENT_INFO_CACHE_SIZE', 1024))
+
 
 @dataclass
 class Patient:
@@ -68,31 +76,19 @@ class Patient:
         return self.status != STATUS_PROCESSING
 
     def is_own(self, user: User) -> bool:
-        pattern_surgery = re.compile(r'^.* ХИРУРГИЯ$')
-        pattern_therapy = re.compile(r'^.* ТЕРАПИЯ$')
-        return ((user.department == self.department)
-                or (pattern_surgery.match(self.department)
-                    and pattern_surgery.match(user.department))
-                or (pattern_therapy.match(self.department)
-                    and pattern_therapy.match(user.department)))
+        return (get_department(self.department).key
+                == get_department(user.department).key)
 
     def is_vascular_center(self) -> bool:
-        return (self.department == 'КАРДИОЛОГИЯ'
-                or self.department == 'НЕВРОЛОГИЯ')
+        return get_department(self.department).is_vascular_center()
 
     def is_therapy_or_cardiology2(self) -> bool:
-        pattern_therapy = re.compile(r'^.* ТЕРАПИЯ$')
-        return (self.department == '2 Кардиология'
-                or pattern_therapy.match(self.department))
+        department = get_department(self.department)
+        return department.is_therapy() or department.is_cardiology2()
 
     def is_inpatient_own(self, user: User) -> bool:
-        pattern_surgery = re.compile(r'^.* ХИРУРГИЯ$')
-        pattern_therapy = re.compile(r'^.* ТЕРАПИЯ$')
-        return ((user.department == self.inpatient_department)
-                or (pattern_surgery.match(str(self.inpatient_department))
-                    and pattern_surgery.match(user.department))
-                or (pattern_therapy.match(str(self.inpatient_department))
-                    and pattern_therapy.match(user.department)))
+        return (get_department(self.inpatient_department).key
+                == get_department(user.department).key)
 
     def is_inpatient(self) -> bool:
         return bool(self.inpatient_department)
@@ -100,61 +96,75 @@ class Patient:
 
 class PatientInfo:
     def __init__(self, patient: Patient):
-        if patient.is_reanimation():
-            self.reanimation_hole = '<u>[РЕАНИМАЦИОННЫЙ ЗАЛ]</u>\n'
-        else:
-            self.reanimation_hole = ''
-        self.admission_date = (
-            f'<u>Дата поступления:</u> {patient.get_admission_date()}\n'
-        )
-        if patient.is_outcome():
-            self.admission_outcome_date = (
-                '<u>Дата исхода:</u> '
-                f'{patient.get_admission_outcome_date()}\n'
-            )
-        else:
-            self.admission_outcome_date = ''
-        self.department = f'<u>Отделение:</u> {patient.department.upper()}\n'
-        if not patient.get_full_name().strip():
-            if patient.gender == 'М':
-                self.full_name = '<u>Ф.И.О.:</u> НЕИЗВЕСТНЫЙ\n'
-            else:
-                self.full_name = '<u>Ф.И.О.:</u> НЕИЗВЕСТНАЯ\n'
-        else:
-            self.full_name = (
-                '<u>Ф.И.О.:</u> '
-                f'{patient.get_full_name()}\n'
-            )
-        self.birthday = (
-            '<u>Дата рождения:</u> '
-            f'{patient.get_birthday()} [{patient.get_age()}]\n'
-        )
-        self.incoming_diagnosis = (
-            '<u>Диагноз при поступлении:</u>\n'
-            f'{patient.incoming_diagnosis}\n'
-        )
-        if patient.admission_diagnosis:
-            self.admission_diagnosis = (
-                '<u>Диагноз приёмного отделения:</u>\n'
-                f'{patient.admission_diagnosis}\n'
-            )
-        else:
-            self.admission_diagnosis = ''
-        self.result = '<u>Исход:</u> '
+        self.patient = patient
+
+    @cached_property
+    def reanimation_hole(self) -> str:
+        if self.patient.is_reanimation():
+            return '<u>[РЕАНИМАЦИОННЫЙ ЗАЛ]</u>\n'
+        return ''
+
+    @cached_property
+    def admission_date(self) -> str:
+        return (f'<u>Дата поступления:</u> '
+                f'{self.patient.get_admission_date()}\n')
+
+    @cached_property
+    def admission_outcome_date(self) -> str:
+        if self.patient.is_outcome():
+            return ('<u>Дата исхода:</u> '
+                    f'{self.patient.get_admission_outcome_date()}\n')
+        return ''
+
+    @cached_property
+    def department(self) -> str:
+        return f'<u>Отделение:</u> {self.patient.department.upper()}\n'
+
+    @cached_property
+    def full_name(self) -> str:
+        if not self.patient.get_full_name().strip():
+            if self.patient.gender == 'М':
+                return '<u>Ф.И.О.:</u> НЕИЗВЕСТНЫЙ\n'
+            return '<u>Ф.И.О.:</u> НЕИЗВЕСТНАЯ\n'
+        return f'<u>Ф.И.О.:</u> {self.patient.get_full_name()}\n'
+
+    @cached_property
+    def birthday(self) -> str:
+        return ('<u>Дата рождения:</u> '
+                f'{self.patient.get_birthday()} [{self.patient.get_age()}]\n')
+
+    @cached_property
+    def incoming_diagnosis(self) -> str:
+        return ('<u>Диагноз при поступлении:</u>\n'
+                f'{self.patient.incoming_diagnosis}\n')
+
+    @cached_property
+    def admission_diagnosis(self) -> str:
+        if self.patient.admission_diagnosis:
+            return ('<u>Диагноз приёмного отделения:</u>\n'
+                    f'{self.patient.admission_diagnosis}\n')
+        return ''
+
+    @cached_property
+    def result(self) -> str:
+        patient = self.patient
+        result = '<u>Исход:</u> '
         if patient.status == STATUS_OUTPATIENT_MAIN:
-            self.result += REJECTIONS.get(patient.reject,
-                                          f'reject={patient.reject}')
+            result += REJECTIONS.get(patient.reject,
+                                     f'reject={patient.reject}')
         elif patient.status == STATUS_INPATIENT:
-            self.result += ('ГОСПИТАЛИЗАЦИЯ '
-                            f'[{patient.inpatient_department.upper()}]')
+            result += ('ГОСПИТАЛИЗАЦИЯ '
+                       f'[{patient.inpatient_department.upper()}]')
         else:
-            self.result += STATUSES.get(patient.status,
-                                        f'status={patient.status}')
-        self.result += '\n'
-        if patient.doctor:
-            self.doctor = f'<u>Врач:</u> {patient.doctor}\n'
-        else:
-            self.doctor = ''
+            result += STATUSES.get(patient.status,
+                                   f'status={patient.status}')
+        return result + '\n'
+
+    @cached_property
+    def doctor(self) -> str:
+        if self.patient.doctor:
+            return f'<u>Врач:</u> {self.patient.doctor}\n'
+        return ''
 
     def get_full_info(self) -> str:
         return (
@@ -192,3 +202,14 @@ class PatientInfo:
             f'{self.result}'
             f'{self.doctor}'
         )
+
+
+@lru_cache(maxsize=PATIENT_INFO_CACHE_SIZE)
+def render_patient_info(view: str, today: date, fields: tuple) -> str:
+    return getattr(PatientInfo(Patient(*fields)), f'get_{view}_info')()
+
+
+def get_patient_info(patient: Patient, view: str) -> str:
+    return render_patient_info(view,
+                               date.today(),
+                               tuple(vars(patient).values()))
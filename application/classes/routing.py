@@ -0,0 +1,56 @@
+from typing import Dict, List, Tuple
+
+from classes.departments import get_department
+from classes.patients import Patient
+from classes.users import USER_DIRECTORY, User, UserDirectory
+from constants import (ALL_NOTIFICATIONS, ALL_REANIMATION_HOLE, OWN_PATIENTS,
+                       OWN_REANIMATION_HOLE, THERAPY_AND_CARDIOLOGY2,
+                       VASCULAR_CENTER)
+
+
+class NotificationRouter:
+    def __init__(self):
+        self.version = -1
+        self.own: Dict[Tuple[str, str], List[User]] = dict()
+        self.own_reanimation: Dict[Tuple[str, str], List[User]] = dict()
+        self.all_reanimation: List[User] = list()
+        self.vascular_center: List[User] = list()
+        self.therapy_and_cardiology2: List[User] = list()
+        self.all_notifications: List[User] = list()
+
+    def build(self, directory: UserDirectory) -> None:
+        levels = directory.by_notification_level
+        self.own = dict()
+        self.own_reanimation = dict()
+        for department, users in directory.by_department.items():
+            key = get_department(department).key
+            for user in users:
+                if user.notification_level == OWN_PATIENTS:
+                    self.own.setdefault(key, []).append(user)
+                elif user.notification_level == OWN_REANIMATION_HOLE:
+                    self.own_reanimation.setdefault(key, []).append(user)
+        self.all_reanimation = levels.get(ALL_REANIMATION_HOLE, [])
+        self.vascular_center = levels.get(VASCULAR_CENTER, [])
+        self.therapy_and_cardiology2 = levels.get(THERAPY_AND_CARDIOLOGY2, [])
+        self.all_notifications = levels.get(ALL_NOTIFICATIONS, [])
+
+    async def load(self) -> None:
+        await USER_DIRECTORY.load()
+        if self.version != USER_DIRECTORY.version:
+            self.build(USER_DIRECTORY)
+            self.version = USER_DIRECTORY.version
+
+    def get_recipients(self, patient: Patient) -> List[User]:
+        key = get_department(patient.department).key
+        recipients = self.all_notifications + self.own.get(key, [])
+        if patient.is_reanimation():
+            recipients += self.own_reanimation.get(key, [])
+            recipients += self.all_reanimation
+        if patient.is_vascular_center():
+            recipients += self.vascular_center
+        if patient.is_therapy_or_cardiology2():
+            recipients += self.therapy_and_cardiology2
+        return recipients
+
+
+NOTIFICATION_ROUTER = NotificationRouter()
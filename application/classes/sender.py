@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Union
+
+from dotenv import load_dotenv
+from telegram import Bot, Message
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
+
+from classes.metrics import SEND_ERRORS, SENDER_MESSAGES
+
+load_dotenv()
+
+SENDER_OVERALL_RATE = float(os.getenv('SENDER_OVERALL_RATE', 30))
+SENDER_CHAT_INTERVAL = float(os.getenv('SENDER_CHAT_INTERVAL', 1))
+SENDER_MAX_CONCURRENCY = int(os.getenv('SENDER_MAX_CONCURRENCY', 16))
+SENDER_MAX_RETRIES = int(os.getenv('SENDER_MAX_RETRIES', 3))
+SENDER_BACKOFF = float(os.getenv('SENDER_BACKOFF', 1))
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, delay: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity,
+                                  self.tokens
+                                  + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class MessageSender:
+    def __init__(self,
+                 overall_rate: float,
+                 chat_interval: float,
+                 max_concurrency: int,
+                 max_retries: int,
+                 backoff: float):
+        self.limiter = RateLimiter(overall_rate)
+        self.chat_interval = chat_interval
+        self.chat_next: Dict[int, float] = dict()
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def count(self, result: str) -> None:
+        setattr(self, result, getattr(self, result) + 1)
+        SENDER_MESSAGES.inc(result=result)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+        }
+
+    def reserve_chat(self, chat_id: int) -> float:
+        now = time.monotonic()
+        if len(self.chat_next) > 1000:
+            self.chat_next = {key: value
+                              for key, value in self.chat_next.items()
+                              if value > now}
+        slot = max(now, self.chat_next.get(chat_id, now))
+        self.chat_next[chat_id] = slot + self.chat_interval
+        return slot - now
+
+    async def send_once(self,
+                        bot: Bot,
+                        chat_id: int,
+                        text: str,
+                        **kwargs) -> Message:
+        try:
+            return await bot.send_message(chat_id, text, **kwargs)
+        except TelegramError as error:
+            SEND_ERRORS.inc(error=type(error).__name__)
+            raise
+
+    async def send(self,
+                   bot: Bot,
+                   chat_id: int,
+                   text: str,
+                   **kwargs) -> Union[Message, None]:
+        delay = self.reserve_chat(chat_id)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        attempt = 0
+        async with self.semaphore:
+            while True:
+                await self.limiter.acquire()
+                try:
+                    message = await self.send_once(bot, chat_id, text,
+                                                   **kwargs)
+                except RetryAfter as error:
+                    last_error = error
+                    delay = error.retry_after
+                    self.limiter.pause(delay)
+                except BadRequest:
+                    self.count('failed')
+                    raise
+                except NetworkError as error:
+                    last_error = error
+                    delay = self.backoff * 2 ** attempt
+                except Exception:
+                    self.count('failed')
+                    raise
+                else:
+                    self.count('sent')
+                    return message
+                if attempt >= self.max_retries:
+                    self.count('failed')
+                    raise last_error
+                logging.warning(f'MessageSender: CHAT_ID={chat_id} '
+                                f'{last_error}, retry in {delay}s')
+                await asyncio.sleep(delay)
+                attempt += 1
+                self.count('retried')
+
+
+SENDER = MessageSender(SENDER_OVERALL_RATE,
+                       SENDER_CHAT_INTERVAL,
+                       SENDER_MAX_CONCURRENCY,
+                       SENDER_MAX_RETRIES,
+                       SENDER_BACKOFF)
@@ -4,9 +4,12 @@ from typing import List
 
 from dotenv import load_dotenv
 from telegram import Bot, Message
+from telegram.constants import BulkRequestLimit
 from telegram.error import BadRequest
 
-from databases.postgresql_db import pg_select_data, pg_write_data
+from databases.postgresql_db import (async_pg_select_data,
+                                     async_pg_write_data,
+                                     async_pg_write_transaction)
 
 load_dotenv()
 
@@ -14,38 +17,46 @@ TO_DELETE_TABLE = 'to_delete'
 DEVELOP = int(os.getenv('DEVELOP'))
 if DEVELOP:
     TO_DELETE_TABLE = 'to_delete_develop'
+DELETE_CHUNK_SIZE = BulkRequestLimit.MAX_LIMIT
+TO_DELETE_EXPIRE_TIME = int(os.getenv('TO_DELETE_EXPIRE_TIME', 86400))
+TO_DELETE_DELETABLE_TIME = int(os.getenv('TO_DELETE_DELETABLE_TIME', 169200))
+TO_DELETE_SWEEP_BATCH = int(os.getenv('TO_DELETE_SWEEP_BATCH', 500))
 
 
 class ToDelete:
     def __init__(self,
+                 chat_id: int,
                  to_delete_id: int | None = None,
-                 chat_id: int | None = None):
-        if to_delete_id and chat_id:
-            raise ValueError('ToDelete: Two initial arguments are '
-                             'specified together, but one was expected')
-        if not (to_delete_id or chat_id):
-            raise ValueError('ToDelete: Initial argument is not specified, '
-                             'one was expected')
+                 messages_ids: List[int] | None = None):
         self.to_delete_id = to_delete_id
         self.chat_id = chat_id
-        self.messages_ids: List[int] = []
-        if to_delete_id:
-            select_query = ("SELECT id, chat_id, messages_id "
-                            f"FROM {TO_DELETE_TABLE} "
-                            "WHERE id = %s")
-            response = pg_select_data(select_query, [to_delete_id])
-            if not response:
-                logging.warning('ToDelete.__init__: '
-                                'No such to_delete_id in database: '
-                                f'{to_delete_id}')
-                return
-            data = response[0]
-            self.to_delete_id, self.chat_id, self.messages_ids = data
-            return
-        write_query = (f"INSERT INTO {TO_DELETE_TABLE} (chat_id) "
-                       "VALUES (%s)")
-        self.to_delete_id = pg_write_data(write_query, [chat_id])
-        self.chat_id = chat_id
+        self.messages_ids: List[int] = list(messages_ids or [])
+
+    @classmethod
+    async def create(cls, chat_id: int) -> 'ToDelete':
+        select_query = "SELECT nextval(pg_get_serial_sequence(%s, 'id'))"
+        response = await async_pg_select_data(select_query,
+                                              [TO_DELETE_TABLE],
+                                              name='reserve_to_delete')
+        if not response:
+            logging.error('ToDelete.create: Unable to reserve to_delete_id')
+            return cls(chat_id)
+        return cls(chat_id, response[0][0])
+
+    @classmethod
+    async def get(cls, to_delete_id: int) -> 'ToDelete | None':
+        select_query = ("SELECT id, chat_id, messages_id "
+                        f"FROM {TO_DELETE_TABLE} "
+                        "WHERE id = %s")
+        response = await async_pg_select_data(select_query, [to_delete_id],
+                                              name='get_to_delete')
+        if not response:
+            logging.warning('ToDelete.get: '
+                            'No such to_delete_id in database: '
+                            f'{to_delete_id}')
+            return None
+        to_delete_id, chat_id, messages_ids = response[0]
+        return cls(chat_id, to_delete_id, messages_ids)
 
     def add(self, message: Message) -> Message:
         if message.message_id in self.messages_ids:
@@ -57,17 +68,26 @@ class ToDelete:
         self.messages_ids.append(message.message_id)
         return message
 
-    def save(self) -> int:
-        write_query = (f"UPDATE {TO_DELETE_TABLE} "
-                       "SET messages_id = %s "
-                       "WHERE id = %s")
-        return pg_write_data(write_query,
-                             [self.messages_ids, self.to_delete_id])
+    async def save(self) -> int | bool:
+        if not self.to_delete_id:
+            logging.warning('ToDelete.save: No to_delete_id')
+            return False
+        write_query = (f"INSERT INTO {TO_DELETE_TABLE} "
+                       "(id, chat_id, messages_id) "
+                       "VALUES (%s, %s, %s) "
+                       "ON CONFLICT (id) DO UPDATE "
+                       "SET messages_id = EXCLUDED.messages_id")
+        return await async_pg_write_data(write_query,
+                                         [self.to_delete_id,
+                                          self.chat_id,
+                                          self.messages_ids],
+                                         name='save_to_delete')
 
     async def delete(self, bot: Bot):
-        for message_id in self.messages_ids:
+        for i in range(0, len(self.messages_ids), DELETE_CHUNK_SIZE):
+            chunk = self.messages_ids[i:i + DELETE_CHUNK_SIZE]
             try:
-                await bot.delete_message(self.chat_id, message_id)
+                await bot.delete_messages(self.chat_id, chunk)
             except BadRequest as error:
                 logging.warning(f'ToDelete.delete: {error.message}')
             except Exception as error:
@@ -75,14 +95,53 @@ class ToDelete:
         self.messages_ids.clear()
 
     async def final_delete(self, bot: Bot) -> int | None:
+        await self.delete(bot)
         if not self.to_delete_id:
-            logging.warning('ToDelete.final_delete: No to_delete_id')
             return None
-        await self.delete(bot)
         write_query = ("DELETE "
                        f"FROM {TO_DELETE_TABLE} "
                        "WHERE id = %s")
-        return pg_write_data(write_query, [self.to_delete_id])
+        return await async_pg_write_data(write_query, [self.to_delete_id],
+                                         name='delete_to_delete')
 
     def __str__(self) -> str:
         return str([self.to_delete_id, self.chat_id, self.messages_ids])
+
+
+async def sweep_to_delete(bot: Bot) -> int:
+    select_query = (
+        "SELECT id, chat_id, messages_id, "
+        "       created >= now() - %s * interval '1 second' "
+        f"FROM {TO_DELETE_TABLE} "
+        "WHERE created < now() - %s * interval '1 second' "
+        "ORDER BY created "
+        "LIMIT %s"
+    )
+    delete_query = ("DELETE "
+                    f"FROM {TO_DELETE_TABLE} "
+                    "WHERE id = ANY(%s)")
+    purged = 0
+    while True:
+        response = await async_pg_select_data(select_query,
+                                              [TO_DELETE_DELETABLE_TIME,
+                                               TO_DELETE_EXPIRE_TIME,
+                                               TO_DELETE_SWEEP_BATCH],
+                                              name='sweep_to_delete')
+        if not response:
+            break
+        for to_delete_id, chat_id, messages_ids, deletable in response:
+            if deletable:
+                await ToDelete(chat_id, to_delete_id, messages_ids).delete(bot)
+        to_delete_ids = [row[0] for row in response]
+        if not await async_pg_write_transaction(
+            [(delete_query, [to_delete_ids])],
+            name='purge_to_delete'
+        ):
+            logging.error('sweep_to_delete: purge ERROR')
+            break
+        purged += len(to_delete_ids)
+        if len(response) < TO_DELETE_SWEEP_BATCH:
+            break
+    if purged:
+        logging.info(f'sweep_to_delete: purged {purged} records')
+    return purged
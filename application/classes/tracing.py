@@ -0,0 +1,134 @@
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Iterator, List, Tuple, Union
+
+from dotenv import load_dotenv
+
+from classes.metrics import Histogram
+
+load_dotenv()
+
+TRACE_SLOW_TIME = float(os.getenv('TRACE_SLOW_TIME', 5))
+TRACE_ENABLE = int(os.getenv('TRACE_ENABLE', 1))
+
+SPAN_SECONDS = Histogram('span_seconds',
+                         'Traced span duration in seconds.',
+                         ('span',))
+
+
+class Span:
+    def __init__(self, name: str):
+        self.name = name
+        self.duration = 0.0
+        self.count = 0
+        self.children: List['Span'] = list()
+
+    def add_child(self, name: str) -> 'Span':
+        child = Span(name)
+        self.children.append(child)
+        return child
+
+    def add_time(self, duration: float) -> None:
+        self.duration += duration
+
+    def get_breakdown(self, level: int = 0) -> List[str]:
+        merged: Dict[str, Tuple[Span, int]] = dict()
+        for child in self.children:
+            if child.name in merged:
+                span, count = merged[child.name]
+                span.duration += child.duration
+                span.children.extend(child.children)
+                merged[child.name] = (span, count + 1)
+            else:
+                span = Span(child.name)
+                span.duration = child.duration
+                span.children = list(child.children)
+                merged[child.name] = (span, 1)
+        lines = [f'{"  " * level}{self.name}: {self.duration:.3f}s']
+        for span, count in merged.values():
+            child_lines = span.get_breakdown(level + 1)
+            if count > 1:
+                child_lines[0] += f' ({count} calls)'
+            lines.extend(child_lines)
+        return lines
+
+
+CURRENT_SPAN: ContextVar[Union[Span, None]] = ContextVar('current_span',
+                                                         default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[Union[Span, None]]:
+    parent = CURRENT_SPAN.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.add_child(name)
+    token = CURRENT_SPAN.set(child)
+    start = time.perf_counter()
+    try:
+        yield child
+    finally:
+        duration = time.perf_counter() - start
+        CURRENT_SPAN.reset(token)
+        child.add_time(duration)
+        SPAN_SECONDS.observe(duration, span=name)
+
+
+@contextmanager
+def trace(name: str) -> Iterator[Union[Span, None]]:
+    if not TRACE_ENABLE:
+        yield None
+        return
+    root = Span(name)
+    token = CURRENT_SPAN.set(root)
+    start = time.perf_counter()
+    try:
+        yield root
+    finally:
+        CURRENT_SPAN.reset(token)
+        root.add_time(time.perf_counter() - start)
+        if root.duration >= TRACE_SLOW_TIME:
+            logging.warning('SLOW UPDATE:\n'
+                            + '\n'.join(root.get_breakdown()))
+
+
+def traced(function):
+    name = function.__qualname__
+    if inspect.isasyncgenfunction(function):
+        @wraps(function)
+        async def generator_wrapper(*args, **kwargs):
+            parent = CURRENT_SPAN.get()
+            if parent is None:
+                async for item in function(*args, **kwargs):
+                    yield item
+                return
+            child = parent.add_child(name)
+            generator = function(*args, **kwargs)
+            try:
+                while True:
+                    token = CURRENT_SPAN.set(child)
+                    start = time.perf_counter()
+                    try:
+                        item = await generator.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        CURRENT_SPAN.reset(token)
+                        child.add_time(time.perf_counter() - start)
+                    yield item
+            finally:
+                await generator.aclose()
+                SPAN_SECONDS.observe(child.duration, span=name)
+        return generator_wrapper
+
+    @wraps(function)
+    async def wrapper(*args, **kwargs):
+        with span(name):
+            return await function(*args, **kwargs)
+    return wrapper
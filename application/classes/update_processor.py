@@ -0,0 +1,163 @@
+import asyncio
+import re
+from typing import Any, Awaitable, Dict, FrozenSet, Hashable, List, Union
+
+from telegram import Update
+from telegram.ext import (BaseHandler, BaseUpdateProcessor,
+                          CallbackQueryHandler, CommandHandler,
+                          ConversationHandler)
+
+from classes.metrics import HANDLER_SECONDS
+from classes.tracing import trace
+
+
+CALLBACK_PREFIX_PATTERN = re.compile(r'^\^?(\w+)')
+
+
+def get_handler_commands(handlers: List[BaseHandler]) -> FrozenSet[str]:
+    commands = set()
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            commands.update(get_handler_commands(handler.entry_points))
+        elif isinstance(handler, CommandHandler):
+            commands.update(f'/{command}' for command in handler.commands)
+        elif (isinstance(handler, CallbackQueryHandler)
+              and isinstance(handler.pattern, re.Pattern)):
+            match = CALLBACK_PREFIX_PATTERN.match(handler.pattern.pattern)
+            if match:
+                commands.add(match.group(1))
+    return frozenset(commands)
+
+
+def get_update_command(update: object) -> str:
+    if not isinstance(update, Update):
+        return 'other'
+    if update.callback_query:
+        return (update.callback_query.data or 'callback').split()[0]
+    message = update.effective_message
+    if message and message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0]
+    return 'message'
+
+
+def get_update_key(update: object) -> Union[Hashable, None]:
+    if isinstance(update, Update) and update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+
+class UpdateQueue(asyncio.Queue):
+    def __init__(self, maxsize: int, max_pending: int):
+        super().__init__()
+        self.limit = maxsize
+        self.max_pending = max(max_pending, 1)
+        self.in_flight = 0
+        self.space = asyncio.Event()
+        self.space.set()
+        self.capacity = asyncio.Event()
+        self.capacity.set()
+
+    def is_full(self, item: Any) -> bool:
+        return (isinstance(item, Update)
+                and 0 < self.limit <= self.qsize())
+
+    async def put(self, item: Any) -> None:
+        while self.is_full(item):
+            self.space.clear()
+            await self.space.wait()
+        super().put_nowait(item)
+
+    def put_nowait(self, item: Any) -> None:
+        if self.is_full(item):
+            raise asyncio.QueueFull
+        super().put_nowait(item)
+
+    async def get(self) -> Any:
+        while self.in_flight >= self.max_pending:
+            self.capacity.clear()
+            await self.capacity.wait()
+        item = await super().get()
+        self.in_flight += 1
+        self.space.set()
+        return item
+
+    def task_done(self) -> None:
+        super().task_done()
+        self.in_flight = max(self.in_flight - 1, 0)
+        if self.in_flight < self.max_pending:
+            self.capacity.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'queued': self.qsize(),
+            'in_flight': self.in_flight,
+        }
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_workers: int, max_pending: int):
+        super().__init__(max(max_pending, max_workers, 2))
+        self.workers = asyncio.Semaphore(max_workers)
+        self.tails: Dict[Hashable, asyncio.Future] = dict()
+        self.waiting = 0
+        self.active = 0
+        self.processed = 0
+        self.commands: FrozenSet[str] = frozenset()
+
+    def set_commands(self, handlers: List[BaseHandler]) -> None:
+        self.commands = get_handler_commands(handlers)
+
+    def get_command(self, update: object) -> str:
+        command = get_update_command(update)
+        if command in self.commands or command in ('message', 'other'):
+            return command
+        return 'other'
+
+    async def wait_turn(self, previous: Union[asyncio.Future, None]) -> None:
+        if previous:
+            await asyncio.shield(previous)
+        await self.workers.acquire()
+
+    async def do_process_update(self,
+                                update: object,
+                                coroutine: Awaitable[Any]) -> None:
+        key = get_update_key(update)
+        previous = self.tails.get(key) if key is not None else None
+        done = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self.tails[key] = done
+        self.waiting += 1
+        try:
+            try:
+                await self.wait_turn(previous)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            command = self.get_command(update)
+            try:
+                with HANDLER_SECONDS.time(command=command), trace(command):
+                    await coroutine
+            finally:
+                self.active -= 1
+                self.processed += 1
+                self.workers.release()
+        finally:
+            if asyncio.iscoroutine(coroutine):
+                coroutine.close()
+            done.set_result(None)
+            if key is not None and self.tails.get(key) is done:
+                del self.tails[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'waiting': self.waiting,
+            'active': self.active,
+            'chats': len(self.tails),
+            'processed': self.processed,
+        }
@@ -1,12 +1,18 @@
+import asyncio
 import logging
 import os
-import re
+import time
 from dataclasses import dataclass
 from typing import Dict, List, Union
 
 from dotenv import load_dotenv
 
-from databases.postgresql_db import pg_select_data, pg_write_data
+from classes.departments import get_department
+from classes.invalidation import (USERS_CHANNEL, PGNotifyListener,
+                                  notify_invalidation)
+from classes.tracing import traced
+from databases.postgresql_db import (async_pg_select_data,
+                                     async_pg_write_data)
 
 load_dotenv()
 
@@ -14,6 +20,7 @@ USERS_TABLE = 'users'
 DEVELOP = int(os.getenv('DEVELOP'))
 if DEVELOP:
     USERS_TABLE = 'users_develop'
+USERS_CACHE_TIME = int(os.getenv('USERS_CACHE_TIME', 300))
 
 
 @dataclass
@@ -34,43 +41,54 @@ class User:
         return f'{self.family} {self.name} {self.surname}'
 
     def get_admission_department(self) -> str:
-        pattern_surgery = re.compile(r'^.* ХИРУРГИЯ$')
-        pattern_therapy = re.compile(r'^.* ТЕРАПИЯ$')
-        if pattern_surgery.match(self.department):
-            return 'ХИРУРГИЯ'
-        if pattern_therapy.match(self.department):
-            return 'ТЕРАПИЯ'
-        return self.department
+        return get_department(self.department).group
 
 
-def set_notification_level(chat_id: int, notification_level: int) -> bool:
+async def invalidate_users() -> None:
+    USER_DIRECTORY.invalidate()
+    if not await notify_invalidation(USERS_CHANNEL):
+        logging.error('invalidate_users: notify ERROR')
+
+
+async def set_notification_level(chat_id: int,
+                                 notification_level: int) -> bool:
     write_query = (
         f"UPDATE {USERS_TABLE} "
         "SET notification_level = %s "
         "WHERE chat_id = %s"
     )
-    return pg_write_data(write_query, [notification_level, chat_id])
+    result = await async_pg_write_data(write_query,
+                                       [notification_level, chat_id],
+                                       name='set_notification_level')
+    await invalidate_users()
+    return result
 
 
-def set_department(chat_id: int, department_id: int) -> bool:
+async def set_department(chat_id: int, department_id: int) -> bool:
     write_query = (
         f"UPDATE {USERS_TABLE} "
         "SET department_id = %s "
         "WHERE chat_id = %s"
     )
-    return pg_write_data(write_query, [department_id, chat_id])
+    result = await async_pg_write_data(write_query, [department_id, chat_id],
+                                       name='set_department')
+    await invalidate_users()
+    return result
 
 
-def set_enable(chat_id: int) -> bool:
+async def set_enable(chat_id: int) -> bool:
     write_query = (
         f"UPDATE {USERS_TABLE} "
         "SET enable = true "
         "WHERE chat_id = %s"
     )
-    return pg_write_data(write_query, [chat_id])
+    result = await async_pg_write_data(write_query, [chat_id],
+                                       name='set_enable')
+    await invalidate_users()
+    return result
 
 
-def insert_user(user: User) -> bool:
+async def insert_user(user: User) -> bool:
     write_query = (
         f"INSERT INTO {USERS_TABLE} "
         "   (family, name, surname, department_id, phone, chat_id, "
@@ -78,7 +96,7 @@ def insert_user(user: User) -> bool:
         "VALUES "
         "   (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
     )
-    return pg_write_data(
+    result = await async_pg_write_data(
         write_query,
         [
             user.family,
@@ -91,12 +109,16 @@ def insert_user(user: User) -> bool:
             user.telegram_full_name,
             user.enable,
             user.admin
-        ]
+        ],
+        name='insert_user'
     )
+    await invalidate_users()
+    return result
 
 
-def get_users(enabled: Union[bool, None] = None,
-              admin: Union[bool, None] = None) -> Union[List[User], None]:
+async def get_users(
+        enabled: Union[bool, None] = None,
+        admin: Union[bool, None] = None) -> Union[List[User], None]:
     where = ''
     variables = None
     if (enabled is not None
@@ -130,7 +152,8 @@ def get_users(enabled: Union[bool, None] = None,
         f"{where}"
         f"ORDER BY {USERS_TABLE}.id"
     )
-    users_data = pg_select_data(select_query, variables)
+    users_data = await async_pg_select_data(select_query, variables,
+                                            name='get_users')
     if not users_data:
         logging.warning(f'PG {USERS_TABLE} table is empty!')
         return None
@@ -140,44 +163,113 @@ def get_users(enabled: Union[bool, None] = None,
     return users
 
 
-def get_enabled_users() -> List[User]:
-    return get_users(enabled=True)
+class UserDirectory:
+    def __init__(self, cache_time: int):
+        self.cache_time = cache_time
+        self.users: Dict[int, User] = dict()
+        self.enabled: List[User] = list()
+        self.admins: List[User] = list()
+        self.by_department: Dict[str, List[User]] = dict()
+        self.by_notification_level: Dict[int, List[User]] = dict()
+        self.version = 0
+        self.generation = 0
+        self.loaded = 0.0
+        self.valid = False
+        self.lock = asyncio.Lock()
 
+    def invalidate(self) -> None:
+        self.generation += 1
+        self.valid = False
 
-def get_admin_users() -> List[User]:
-    return get_users(admin=True)
+    def is_fresh(self) -> bool:
+        return (self.valid
+                and time.monotonic() - self.loaded < self.cache_time)
 
+    async def refresh(self) -> bool:
+        generation = self.generation
+        users = await get_users()
+        if users is None:
+            logging.error('UserDirectory.refresh: users are not loaded')
+            return False
+        self.set_users(users)
+        self.valid = generation == self.generation
+        return True
 
-def get_user(chat_id: int) -> Union[User, None]:
-    select_query = (
-        f"SELECT {USERS_TABLE}.family, "
-        f"       {USERS_TABLE}.name, "
-        f"       {USERS_TABLE}.surname, "
-        "        departments.name, "
-        f"       {USERS_TABLE}.phone, "
-        f"       {USERS_TABLE}.chat_id, "
-        f"       {USERS_TABLE}.telegram_full_name, "
-        f"       {USERS_TABLE}.notification_level, "
-        f"       {USERS_TABLE}.enable, "
-        f"       {USERS_TABLE}.admin, "
-        f"       {USERS_TABLE}.id "
-        f"FROM {USERS_TABLE} "
-        f"  JOIN departments ON {USERS_TABLE}.department_id = departments.id "
-        f"WHERE {USERS_TABLE}.chat_id = %s "
-    )
-    user_data = pg_select_data(select_query, [chat_id])
-    if not user_data:
-        return None
-    return User(*user_data[0])
+    def set_users(self, users: List[User]) -> None:
+        self.users = dict()
+        self.enabled = list()
+        self.admins = list()
+        self.by_department = dict()
+        self.by_notification_level = dict()
+        for user in users:
+            self.users[user.chat_id] = user
+            if user.admin:
+                self.admins.append(user)
+            if not user.enable:
+                continue
+            self.enabled.append(user)
+            self.by_department.setdefault(user.department, []).append(user)
+            self.by_notification_level.setdefault(
+                user.notification_level, []
+            ).append(user)
+        self.version += 1
+        self.loaded = time.monotonic()
+
+    async def load(self) -> None:
+        if self.is_fresh():
+            return
+        async with self.lock:
+            if not self.is_fresh():
+                await self.refresh()
+
+    async def get(self, chat_id: int) -> Union[User, None]:
+        await self.load()
+        return self.users.get(chat_id)
+
+    async def get_enabled(self) -> List[User]:
+        await self.load()
+        return self.enabled
+
+    async def get_admins(self) -> List[User]:
+        await self.load()
+        return self.admins
+
+
+USER_DIRECTORY = UserDirectory(USERS_CACHE_TIME)
+
+
+def start_users_listener() -> PGNotifyListener:
+    loop = asyncio.get_running_loop()
+
+    def on_notify(_: str) -> None:
+        loop.call_soon_threadsafe(USER_DIRECTORY.invalidate)
+
+    listener = PGNotifyListener(USERS_CHANNEL, on_notify)
+    listener.start()
+    return listener
+
+
+async def get_enabled_users() -> List[User]:
+    return await USER_DIRECTORY.get_enabled()
+
+
+async def get_admin_users() -> List[User]:
+    return await USER_DIRECTORY.get_admins()
+
+
+@traced
+async def get_user(chat_id: int) -> Union[User, None]:
+    return await USER_DIRECTORY.get(chat_id)
 
 
-def get_departments() -> Union[Dict[int, str], None]:
+async def get_departments() -> Union[Dict[int, str], None]:
     select_query = (
         "SELECT id, name "
         "FROM departments "
         "ORDER BY id"
     )
-    departments_data = pg_select_data(select_query)
+    departments_data = await async_pg_select_data(select_query,
+                                                  name='get_departments')
     if not departments_data:
         logging.warning('PG departments table is empty!')
         return None
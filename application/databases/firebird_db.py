@@ -1,11 +1,21 @@
+import asyncio
 import logging
 import os
-from typing import Union
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Tuple, Union
 
 import fdb
 from dotenv import load_dotenv
-from fdb.fbcore import (ISOLATION_LEVEL_READ_COMMITED_RO, Connection,
-                        InternalError, isc_info_page_size, isc_info_version)
+from fdb.fbcore import (ISOLATION_LEVEL_READ_COMMITED_RO, Connection, Cursor,
+                        DatabaseError, InterfaceError, InternalError,
+                        PreparedStatement, isc_info_page_size,
+                        isc_info_version)
+
+from classes.metrics import (DB_QUERY_ERRORS, DB_QUERY_SECONDS, get_query_name,
+                             timed_query)
+from databases.pool import ConnectionPool
 
 load_dotenv()
 
@@ -13,11 +23,30 @@ FB_DSN = os.getenv('FB_DSN')
 FB_USER = os.getenv('FB_USER')
 FB_PASSWORD = os.getenv('FB_PASSWORD')
 FB_LIBRARY_NAME = os.getenv('FB_LIBRARY_NAME')
+FB_MAX_WORKERS = int(os.getenv('FB_MAX_WORKERS', 4))
+FB_POOL_MIN_SIZE = int(os.getenv('FB_POOL_MIN_SIZE', 1))
+FB_POOL_MAX_SIZE = int(os.getenv('FB_POOL_MAX_SIZE', FB_MAX_WORKERS))
+FB_POOL_IDLE_TIMEOUT = int(os.getenv('FB_POOL_IDLE_TIMEOUT', 600))
+FB_POOL_PING_INTERVAL = int(os.getenv('FB_POOL_PING_INTERVAL', 60))
+FB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('FB_POOL_ACQUIRE_TIMEOUT', 30))
+FB_FETCH_SIZE = int(os.getenv('FB_FETCH_SIZE', 100))
+FB_STATEMENT_CACHE_SIZE = int(os.getenv('FB_STATEMENT_CACHE_SIZE', 32))
+FB_PING_QUERY = 'SELECT 1 FROM RDB$DATABASE'
+FB_CONNECTION_SQLCODE = -902
+
+FB_EXECUTOR = ThreadPoolExecutor(max_workers=FB_MAX_WORKERS,
+                                 thread_name_prefix='fdb')
+FB_CONNECTIONS = asyncio.Semaphore(max(FB_POOL_MAX_SIZE, 1))
+FB_STREAMS = asyncio.Semaphore(max(FB_POOL_MAX_SIZE - 1, 1))
 
 
 class MyConnection(Connection):
     def __init__(self, db_handle, dpb=None, sql_dialect=3, charset=None,
                  isolation_level=ISOLATION_LEVEL_READ_COMMITED_RO):
+        self.statement_cursor: Union[Cursor, None] = None
+        self.prepared_statements: OrderedDict[str, PreparedStatement] = (
+            OrderedDict()
+        )
         try:
             super(MyConnection, self).__init__(db_handle, dpb, sql_dialect,
                                                charset,
@@ -40,6 +69,22 @@ class MyConnection(Connection):
             else:
                 raise
 
+    def execute_prepared(self,
+                         operation: str,
+                         parameters: Union[list, None] = None) -> Cursor:
+        if self.statement_cursor is None:
+            self.statement_cursor = self.cursor()
+        statement = self.prepared_statements.get(operation)
+        if statement is None:
+            statement = self.statement_cursor.prep(operation)
+            self.prepared_statements[operation] = statement
+            while len(self.prepared_statements) > FB_STATEMENT_CACHE_SIZE:
+                self.prepared_statements.popitem(last=False)
+        else:
+            self.prepared_statements.move_to_end(operation)
+        self.statement_cursor.execute(statement, parameters)
+        return self.statement_cursor
+
 
 def connect_fdb():
     try:
@@ -58,23 +103,167 @@ def connect_fdb():
     return connection
 
 
+def ping_fdb(connection: Connection) -> None:
+    cursor = connection.cursor()
+    cursor.execute(FB_PING_QUERY)
+    cursor.fetchall()
+    cursor.close()
+    connection.commit()
+
+
+def reset_fdb(connection: Connection) -> None:
+    connection.commit()
+
+
+def is_connection_error(error: Exception) -> bool:
+    if isinstance(error, (InterfaceError, OSError)):
+        return True
+    return (isinstance(error, DatabaseError)
+            and len(error.args) > 1
+            and error.args[1] == FB_CONNECTION_SQLCODE)
+
+
+FB_POOL = ConnectionPool('FDB',
+                         connect=connect_fdb,
+                         ping=ping_fdb,
+                         reset=reset_fdb,
+                         min_size=FB_POOL_MIN_SIZE,
+                         max_size=FB_POOL_MAX_SIZE,
+                         idle_timeout=FB_POOL_IDLE_TIMEOUT,
+                         ping_interval=FB_POOL_PING_INTERVAL,
+                         acquire_timeout=FB_POOL_ACQUIRE_TIMEOUT)
+
+
+@timed_query('fdb')
+def fb_fetch_data(select_query: str,
+                  parameters: Union[list, None] = None) -> list:
+    for attempt in range(2):
+        connection = FB_POOL.acquire()
+        if not connection:
+            raise ConnectionError('FDB CONNECT ERROR')
+        try:
+            cursor = connection.execute_prepared(select_query, parameters)
+            data = cursor.fetchall()
+            cursor.close()
+        except Exception as error:
+            if not is_connection_error(error):
+                FB_POOL.release(connection)
+                raise
+            FB_POOL.discard(connection)
+            if attempt:
+                raise
+            logging.warning(f'FDB QUERY: {error}, reconnecting')
+            FB_POOL.discard_idle()
+            continue
+        FB_POOL.release(connection)
+        logging.info('FDB QUERY SUCCESS')
+        return data
+
+
 def fb_select_data(select_query: str,
                    parameters: Union[list, None] = None) -> list:
-    connection = connect_fdb()
-    if not connection:
-        return []
-    cursor = connection.cursor()
     try:
-        cursor.execute(select_query, parameters=parameters)
-        data = cursor.fetchall()
+        return fb_fetch_data(select_query, parameters)
     except Exception as error:
         logging.error(f'FDB QUERY: {error}')
         return []
-    finally:
+
+
+def fb_open_cursor(select_query: str,
+                   parameters: Union[list, None] = None) -> Tuple:
+    connection = FB_POOL.acquire()
+    if not connection:
+        raise ConnectionError('FDB CONNECT ERROR')
+    try:
+        cursor = connection.execute_prepared(select_query, parameters)
+    except Exception as error:
+        if is_connection_error(error):
+            FB_POOL.discard(connection)
+        else:
+            FB_POOL.release(connection)
+        raise
+    return connection, cursor
+
+
+def fb_close_cursor(connection: Connection, cursor, failed: bool) -> None:
+    if failed:
+        FB_POOL.discard(connection)
+        return
+    try:
+        cursor.close()
+    except Exception as error:
+        logging.error(f'FDB CURSOR CLOSE: {error}')
+        FB_POOL.discard(connection)
+        return
+    FB_POOL.release(connection)
+
+
+async def async_fb_iter_data(
+        select_query: str,
+        parameters: Union[list, None] = None,
+        fetch_size: int = FB_FETCH_SIZE) -> AsyncIterator[tuple]:
+    async with FB_STREAMS, FB_CONNECTIONS:
+        rows = fb_iter_cursor(select_query, parameters, fetch_size)
         try:
-            cursor.close()
-            connection.close()
-        except Exception as error:
-            logging.error(f'FDB CLOSE: {error}')
-    logging.info('FDB QUERY SUCCESS')
-    return data
+            async for row in rows:
+                yield row
+        finally:
+            await rows.aclose()
+
+
+async def fb_iter_cursor(select_query: str,
+                         parameters: Union[list, None],
+                         fetch_size: int) -> AsyncIterator[tuple]:
+    loop = asyncio.get_running_loop()
+    query_name = get_query_name(select_query)
+    start = time.perf_counter()
+    try:
+        connection, cursor = await loop.run_in_executor(
+            FB_EXECUTOR, fb_open_cursor, select_query, parameters
+        )
+    except Exception as error:
+        DB_QUERY_ERRORS.inc(db='fdb', query=query_name)
+        logging.error(f'FDB QUERY: {error}')
+        return
+    elapsed = time.perf_counter() - start
+    failed = False
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                rows = await loop.run_in_executor(FB_EXECUTOR,
+                                                  cursor.fetchmany,
+                                                  fetch_size)
+            except asyncio.CancelledError:
+                failed = True
+                raise
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            for row in rows:
+                yield row
+        logging.info('FDB QUERY SUCCESS')
+    except Exception as error:
+        failed = is_connection_error(error)
+        DB_QUERY_ERRORS.inc(db='fdb', query=query_name)
+        logging.error(f'FDB QUERY: {error}')
+    finally:
+        DB_QUERY_SECONDS.observe(elapsed, db='fdb', query=query_name)
+        await loop.run_in_executor(FB_EXECUTOR, fb_close_cursor,
+                                   connection, cursor, failed)
+
+
+async def async_fb_fetch_data(select_query: str,
+                              parameters: Union[list, None] = None) -> list:
+    loop = asyncio.get_running_loop()
+    async with FB_CONNECTIONS:
+        return await loop.run_in_executor(FB_EXECUTOR, fb_fetch_data,
+                                          select_query, parameters)
+
+
+async def async_fb_select_data(select_query: str,
+                               parameters: Union[list, None] = None) -> list:
+    loop = asyncio.get_running_loop()
+    async with FB_CONNECTIONS:
+        return await loop.run_in_executor(FB_EXECUTOR, fb_select_data,
+                                          select_query, parameters)
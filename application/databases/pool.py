@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+
+class ConnectionPool:
+    def __init__(self,
+                 name: str,
+                 connect: Callable[[], Any],
+                 ping: Callable[[Any], None],
+                 reset: Callable[[Any], None],
+                 min_size: int,
+                 max_size: int,
+                 idle_timeout: int,
+                 ping_interval: int,
+                 acquire_timeout: Union[float, None] = None):
+        self.name = name
+        self.connect = connect
+        self.ping = ping
+        self.reset = reset
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.acquire_timeout = acquire_timeout
+        self.size = 0
+        self.waiting = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.idle: List[Tuple[Any, float]] = []
+        self.condition = threading.Condition()
+
+    def close_connection(self, connection) -> None:
+        try:
+            connection.close()
+        except Exception as error:
+            logging.error(f'{self.name} CLOSE: {error}')
+
+    def close_expired(self) -> None:
+        expired = list()
+        with self.condition:
+            now = time.monotonic()
+            while (self.idle
+                   and self.size > self.min_size
+                   and now - self.idle[0][1] > self.idle_timeout):
+                expired.append(self.idle.pop(0)[0])
+                self.size -= 1
+        for connection in expired:
+            self.close_connection(connection)
+
+    def is_alive(self, connection) -> bool:
+        try:
+            self.ping(connection)
+        except Exception as error:
+            logging.warning(f'{self.name} PING: {error}')
+            return False
+        return True
+
+    def wait_available(self) -> bool:
+        deadline = None
+        if self.acquire_timeout is not None:
+            deadline = time.monotonic() + self.acquire_timeout
+        self.waiting += 1
+        try:
+            while not self.idle and self.size >= self.max_size:
+                if deadline is None:
+                    self.condition.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    return False
+                self.condition.wait(remaining)
+        finally:
+            self.waiting -= 1
+        return True
+
+    def acquire(self) -> Union[Any, None]:
+        self.close_expired()
+        while True:
+            with self.condition:
+                if not self.wait_available():
+                    logging.error(f'{self.name} POOL: acquire timed out '
+                                  f'after {self.acquire_timeout}s')
+                    return None
+                if not self.idle:
+                    self.size += 1
+                    break
+                connection, last_used = self.idle.pop()
+            if (time.monotonic() - last_used < self.ping_interval
+                    or self.is_alive(connection)):
+                return connection
+            self.discard(connection)
+        connection = self.connect()
+        with self.condition:
+            if connection:
+                self.created += 1
+            else:
+                self.size -= 1
+                self.condition.notify()
+        return connection
+
+    def release(self, connection) -> None:
+        try:
+            self.reset(connection)
+        except Exception as error:
+            logging.warning(f'{self.name} RELEASE: {error}')
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection) -> None:
+        self.close_connection(connection)
+        with self.condition:
+            self.size -= 1
+            self.discarded += 1
+            self.condition.notify()
+
+    def discard_idle(self) -> None:
+        with self.condition:
+            idle = self.idle
+            self.idle = list()
+            self.size -= len(idle)
+            self.discarded += len(idle)
+            self.condition.notify_all()
+        for connection, _ in idle:
+            self.close_connection(connection)
+
+    def close(self) -> None:
+        self.discard_idle()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self.condition:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                'waiting': self.waiting,
+                'created': self.created,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts,
+            }
@@ -1,11 +1,17 @@
+import asyncio
 import logging
 import os
-from typing import Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Tuple, Union
 
 import psycopg2
 from dotenv import load_dotenv
 from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 
+from classes.metrics import timed_query
+from databases.pool import ConnectionPool
+
 load_dotenv()
 
 PG_HOST = os.getenv('PG_HOST')
@@ -13,15 +19,25 @@ PG_PORT = int(os.getenv('PG_PORT'))
 PG_DATABASE = os.getenv('POSTGRES_DB')
 PG_USER = os.getenv('POSTGRES_USER')
 PG_PASSWORD = os.getenv('POSTGRES_PASSWORD')
+PG_MAX_WORKERS = int(os.getenv('PG_MAX_WORKERS', 8))
+PG_POOL_MIN_SIZE = int(os.getenv('PG_POOL_MIN_SIZE', 1))
+PG_POOL_MAX_SIZE = int(os.getenv('PG_POOL_MAX_SIZE', PG_MAX_WORKERS))
+PG_POOL_IDLE_TIMEOUT = int(os.getenv('PG_POOL_IDLE_TIMEOUT', 600))
+PG_POOL_PING_INTERVAL = int(os.getenv('PG_POOL_PING_INTERVAL', 60))
+PG_POOL_ACQUIRE_TIMEOUT = float(os.getenv('PG_POOL_ACQUIRE_TIMEOUT', 30))
+
+PG_EXECUTOR = ThreadPoolExecutor(max_workers=PG_MAX_WORKERS,
+                                 thread_name_prefix='psycopg2')
 
 
-def connect_psql():
+def connect_psql(**options):
     try:
         connection = psycopg2.connect(host=PG_HOST,
                                       port=PG_PORT,
                                       database=PG_DATABASE,
                                       user=PG_USER,
-                                      password=PG_PASSWORD)
+                                      password=PG_PASSWORD,
+                                      **options)
         connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
     except Exception as error:
         logging.error(f'PG CONNECT: {error}')
@@ -29,37 +45,126 @@ def connect_psql():
     return connection
 
 
+def ping_psql(connection) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+
+
+def reset_psql(connection) -> None:
+    if connection.closed:
+        raise psycopg2.InterfaceError('connection already closed')
+    connection.rollback()
+
+
+PG_POOL = ConnectionPool('PG',
+                         connect=connect_psql,
+                         ping=ping_psql,
+                         reset=reset_psql,
+                         min_size=PG_POOL_MIN_SIZE,
+                         max_size=PG_POOL_MAX_SIZE,
+                         idle_timeout=PG_POOL_IDLE_TIMEOUT,
+                         ping_interval=PG_POOL_PING_INTERVAL,
+                         acquire_timeout=PG_POOL_ACQUIRE_TIMEOUT)
+
+
+@timed_query('pg')
 def pg_select_data(select_query: str,
                    variables: Union[list, None] = None) -> Union[list, None]:
-    connection = connect_psql()
-    if not connection:
-        return None
-    try:
-        cursor = connection.cursor()
-        cursor.execute(select_query, vars=variables)
-        data = cursor.fetchall()
-    except Exception as error:
-        logging.error(f'PG QUERY: {error}')
-        return None
-    if connection:
-        cursor.close()
-        connection.close()
-    return data
+    for attempt in range(2):
+        connection = PG_POOL.acquire()
+        if not connection:
+            return None
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(select_query, vars=variables)
+                data = cursor.fetchall()
+        except psycopg2.OperationalError as error:
+            PG_POOL.discard(connection)
+            if attempt:
+                logging.error(f'PG QUERY: {error}')
+                return None
+            logging.warning(f'PG QUERY: {error}, reconnecting')
+            PG_POOL.discard_idle()
+            continue
+        except Exception as error:
+            logging.error(f'PG QUERY: {error}')
+            PG_POOL.release(connection)
+            return None
+        PG_POOL.release(connection)
+        return data
+    return None
 
 
+@timed_query('pg', error_result=False)
 def pg_write_data(write_query: str,
                   variables: Union[list, None] = None) -> Union[int, bool]:
-    connection = connect_psql()
+    connection = PG_POOL.acquire()
     if not connection:
         return False
     try:
-        cursor = connection.cursor()
-        cursor.execute(write_query + ' RETURNING id', vars=variables)
-        query_id = cursor.fetchone()[0]
+        with connection.cursor() as cursor:
+            cursor.execute(write_query + ' RETURNING id', vars=variables)
+            query_id = cursor.fetchone()[0]
     except Exception as error:
         logging.error(f'PG QUERY: {error}')
+        PG_POOL.release(connection)
         return False
-    if connection:
-        cursor.close()
-        connection.close()
+    PG_POOL.release(connection)
     return query_id
+
+
+@timed_query('pg', error_result=False)
+def pg_write_transaction(
+        queries: List[Tuple[str, Union[list, None]]]) -> bool:
+    connection = PG_POOL.acquire()
+    if not connection:
+        return False
+    try:
+        connection.autocommit = False
+        with connection.cursor() as cursor:
+            for write_query, variables in queries:
+                cursor.execute(write_query, vars=variables)
+        connection.commit()
+        result = True
+    except Exception as error:
+        logging.error(f'PG TRANSACTION: {error}')
+        result = False
+    finally:
+        try:
+            connection.rollback()
+            connection.autocommit = True
+        except Exception as error:
+            logging.error(f'PG TRANSACTION: {error}')
+    PG_POOL.release(connection)
+    return result
+
+
+async def async_pg_select_data(
+        select_query: str,
+        variables: Union[list, None] = None,
+        name: Union[str, None] = None) -> Union[list, None]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        PG_EXECUTOR, partial(pg_select_data, select_query, variables,
+                             name=name)
+    )
+
+
+async def async_pg_write_data(
+        write_query: str,
+        variables: Union[list, None] = None,
+        name: Union[str, None] = None) -> Union[int, bool]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        PG_EXECUTOR, partial(pg_write_data, write_query, variables,
+                             name=name)
+    )
+
+
+async def async_pg_write_transaction(
+        queries: List[Tuple[str, Union[list, None]]],
+        name: Union[str, None] = None) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        PG_EXECUTOR, partial(pg_write_transaction, queries, name=name)
+    )
@@ -0,0 +1,42 @@
+from functools import lru_cache
+
+from classes.metrics import register_query_name
+
+ADMISSIONS_SELECT = (
+    "SELECT main_card.id_pac, "
+    "       main_card.id, "
+    "       main_card.d_in, "
+    "       main_card.d_out, "
+    "       patient.fm, "
+    "       patient.im, "
+    "       patient.ot, "
+    "       patient.dtr, "
+    "       patient.pol, "
+    "       department.short, "
+    "       main_card.remzal, "
+    "       main_card.dsnapr, "
+    "       main_card.dspriem, "
+    "       main_card.id_dvig, "
+    "       main_card.id_otkaz, "
+    "       inpatient_department.short, "
+    "       doctor.last_name "
+    "           || ' ' || doctor.first_name "
+    "           || ' ' || doctor.middle_name "
+    "FROM main_card "
+    "   LEFT JOIN pacient patient ON main_card.id_pac = patient.id "
+    "   LEFT JOIN priemnic department "
+    "       ON main_card.id_priem = department.id "
+    "   LEFT JOIN priemnic inpatient_department "
+    "       ON main_card.id_gotd = inpatient_department.id "
+    "   LEFT JOIN doctor ON main_card.amb_doc_id = doctor.doctor_id "
+)
+
+
+@lru_cache(maxsize=None)
+def build_admissions_query(condition: str, name: str = 'admissions') -> str:
+    query = (ADMISSIONS_SELECT
+             + "WHERE "
+             + condition
+             + " ORDER BY main_card.id")
+    register_query_name(query, name)
+    return query
@@ -0,0 +1,12 @@
+SET TERM ^ ;
+
+CREATE OR ALTER TRIGGER main_card_insert_event FOR main_card
+ACTIVE AFTER INSERT POSITION 100
+AS
+BEGIN
+    POST_EVENT 'main_card_insert';
+END^
+
+SET TERM ; ^
+
+COMMIT;
@@ -0,0 +1,19 @@
+CREATE TABLE IF NOT EXISTS notifier_outbox (
+    id SERIAL PRIMARY KEY,
+    card_id INTEGER NOT NULL UNIQUE,
+    patient JSONB NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT now(),
+    delivered BOOLEAN NOT NULL DEFAULT false
+);
+
+CREATE INDEX IF NOT EXISTS notifier_outbox_pending_idx
+    ON notifier_outbox (id)
+    WHERE NOT delivered;
+
+CREATE TABLE IF NOT EXISTS notifier_deliveries (
+    id SERIAL PRIMARY KEY,
+    outbox_id INTEGER NOT NULL
+        REFERENCES notifier_outbox (id) ON DELETE CASCADE,
+    chat_id BIGINT NOT NULL,
+    UNIQUE (outbox_id, chat_id)
+);
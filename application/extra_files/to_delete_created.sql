@@ -0,0 +1,11 @@
+ALTER TABLE to_delete
+    ADD COLUMN IF NOT EXISTS created TIMESTAMP NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS to_delete_created_idx
+    ON to_delete (created);
+
+ALTER TABLE to_delete_develop
+    ADD COLUMN IF NOT EXISTS created TIMESTAMP NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS to_delete_develop_created_idx
+    ON to_delete_develop (created);
@@ -2,8 +2,9 @@ import logging
 import os
 
 from dotenv import load_dotenv
-from telegram.ext import (Application, CallbackQueryHandler, CommandHandler,
-                          ConversationHandler, MessageHandler, filters)
+from telegram.ext import (Application, CallbackContext, CallbackQueryHandler,
+                          CommandHandler, ConversationHandler, MessageHandler,
+                          filters)
 
 from callbacks.common_callbacks import (check_date_from_message,
                                         get_date_from_message)
@@ -19,9 +20,23 @@ from callbacks.start import (activate_user, start, start_department,
                              start_family, start_name, start_phone,
                              start_surname)
 from callbacks.summary import show_summary_today, show_summary_yesterday
+from classes.admissions import ADMISSIONS, ADMISSIONS_RESYNC_TIME
+from classes.cache import CACHES
 from classes.handlers import EndHandler
+from classes.leader import LEADER, LEADER_CHECK_TIME
+from classes.metrics import Gauge, start_metrics_server
+from classes.outbox import purge_outbox
+from classes.patients import render_patient_info
+from classes.sender import SENDER
+from classes.to_delete import sweep_to_delete
+from classes.update_processor import ChatOrderedUpdateProcessor, UpdateQueue
+from classes.users import start_users_listener
 from constants import DEPARTMENT, FAMILY, NAME, PHONE, SHOW, SURNAME
-from notifier import start_notifier
+from databases.firebird_db import FB_POOL
+from databases.postgresql_db import PG_POOL
+from notifier import (NOTIFIER_MODE, elect_notifier, poll_notifier,
+                      resync_admissions, start_notifier,
+                      start_notifier_events)
 
 load_dotenv()
 logging.basicConfig(
@@ -31,14 +46,135 @@ logging.basicConfig(
 
 TOKEN = os.getenv('TOKEN')
 DEVELOP = int(os.getenv('DEVELOP'))
-RETRY_TIME = 30
+NOTIFIER_BACKSTOP_TIME = int(os.getenv('NOTIFIER_BACKSTOP_TIME', 300))
+STATS_TIME = int(os.getenv('STATS_TIME', 600))
+TO_DELETE_SWEEP_TIME = int(os.getenv('TO_DELETE_SWEEP_TIME', 3600))
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', 256))
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', 8))
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', 1024))
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8443))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'monitor-bot')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_CERT = os.getenv('WEBHOOK_CERT')
+WEBHOOK_KEY = os.getenv('WEBHOOK_KEY')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
 if DEVELOP:
     TOKEN = os.getenv('TOKEN_DEVELOP')
-    RETRY_TIME = 30
+
+
+def register_gauges(application: Application) -> None:
+    Gauge('update_queue',
+          'Updates queued and taken from the queue but not finished.',
+          ('stat',),
+          collect=lambda: {
+              (name,): value
+              for name, value in application.update_queue.get_stats().items()
+          })
+    Gauge('update_processor',
+          'Update processor state.',
+          ('stat',),
+          collect=lambda: {
+              (name,): value
+              for name, value in application.update_processor.get_stats()
+              .items()
+          })
+    Gauge('db_pool',
+          'Database connection pool state.',
+          ('pool', 'stat'),
+          collect=lambda: {
+              (pool.name, name): value
+              for pool in (FB_POOL, PG_POOL)
+              for name, value in pool.get_stats().items()
+          })
+    Gauge('render_cache',
+          'Patient info render cache state.',
+          ('stat',),
+          collect=lambda: dict(
+              zip([('hits',), ('misses',), ('max_size',), ('size',)],
+                  render_patient_info.cache_info())
+          ))
+
+
+async def start_services(application: Application) -> None:
+    application.bot_data['notifier_events'] = start_notifier_events(
+        application
+    )
+    application.bot_data['users_listener'] = start_users_listener()
+    register_gauges(application)
+    try:
+        application.bot_data['metrics_server'] = await start_metrics_server()
+    except OSError as error:
+        logging.error(f'METRICS: {error}')
+
+
+async def close_databases(application: Application) -> None:
+    for name in ('notifier_events', 'users_listener'):
+        listener = application.bot_data.get(name)
+        if listener:
+            listener.stop()
+    metrics_server = application.bot_data.get('metrics_server')
+    if metrics_server:
+        metrics_server.close()
+    LEADER.release()
+    FB_POOL.close()
+    PG_POOL.close()
+
+
+async def log_stats(context: CallbackContext) -> None:
+    application = context.application
+    logging.info(f'UPDATES: {application.update_queue.get_stats()}, '
+                 f'{application.update_processor.get_stats()}')
+    for pool in (FB_POOL, PG_POOL):
+        logging.info(f'{pool.name} POOL: {pool.get_stats()}')
+    for cache in CACHES:
+        logging.info(f'{cache.name} CACHE: {cache.get_stats()}')
+    logging.info(f'SENDER: {SENDER.get_stats()}')
+
+
+async def sweep_messages(context: CallbackContext) -> None:
+    if LEADER.is_leader:
+        await sweep_to_delete(context.bot)
+        if not await purge_outbox():
+            logging.error('purge_outbox ERROR')
+
+
+def build_application() -> Application:
+    update_processor = ChatOrderedUpdateProcessor(UPDATE_WORKERS,
+                                                  UPDATE_MAX_PENDING)
+    builder = (Application.builder()
+               .token(TOKEN)
+               .update_queue(UpdateQueue(UPDATE_QUEUE_SIZE,
+                                         UPDATE_MAX_PENDING))
+               .concurrent_updates(update_processor)
+               .post_init(start_services)
+               .post_shutdown(close_databases))
+    if TELEGRAM_BASE_URL:
+        builder = (builder
+                   .base_url(f'{TELEGRAM_BASE_URL}/bot')
+                   .base_file_url(f'{TELEGRAM_BASE_URL}/file/bot'))
+    return builder.build()
+
+
+def run_application(application: Application) -> None:
+    if BOT_MODE != 'webhook':
+        application.run_polling()
+        return
+    application.run_webhook(listen=WEBHOOK_LISTEN,
+                            port=WEBHOOK_PORT,
+                            url_path=WEBHOOK_PATH,
+                            webhook_url=WEBHOOK_URL,
+                            secret_token=WEBHOOK_SECRET_TOKEN,
+                            cert=WEBHOOK_CERT,
+                            key=WEBHOOK_KEY,
+                            max_connections=WEBHOOK_MAX_CONNECTIONS)
 
 
 def main() -> None:
-    application = Application.builder().token(TOKEN).build()
+    application = build_application()
 
     application.add_handler(ConversationHandler(
         entry_points=[CommandHandler('start', start)],
@@ -100,8 +236,26 @@ def main() -> None:
     application.add_handler(CallbackQueryHandler(pattern=r'^history \d+$',
                                                  callback=show_history))
 
-    application.job_queue.run_repeating(start_notifier, RETRY_TIME)
-    application.run_polling()
+    application.job_queue.run_repeating(elect_notifier, LEADER_CHECK_TIME,
+                                        first=0)
+    if NOTIFIER_MODE == 'poll':
+        application.job_queue.run_once(poll_notifier, 0)
+    else:
+        application.job_queue.run_repeating(start_notifier,
+                                            NOTIFIER_BACKSTOP_TIME)
+    if ADMISSIONS.is_enabled():
+        application.job_queue.run_repeating(resync_admissions,
+                                            ADMISSIONS_RESYNC_TIME,
+                                            first=0)
+    application.job_queue.run_repeating(log_stats, STATS_TIME)
+    application.job_queue.run_repeating(sweep_messages, TO_DELETE_SWEEP_TIME,
+                                        first=60)
+    application.update_processor.set_commands(
+        [handler
+         for handlers in application.handlers.values()
+         for handler in handlers]
+    )
+    run_application(application)
 
 
 if __name__ == "__main__":
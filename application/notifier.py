@@ -1,19 +1,30 @@
+import asyncio
 import logging
 import os
-from typing import Union
+from datetime import datetime
+from typing import List, Union
 
 from dotenv import load_dotenv
-from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CallbackContext
-
-from classes.patients import Patient, PatientInfo
-from classes.users import User, get_enabled_users
-from constants import (ALL_NOTIFICATIONS, ALL_REANIMATION_HOLE, OWN_PATIENTS,
-                       OWN_REANIMATION_HOLE, THERAPY_AND_CARDIOLOGY2,
-                       VASCULAR_CENTER)
-from databases.firebird_db import fb_select_data
-from databases.postgresql_db import pg_select_data, pg_write_data
-from utils import build_menu, send_message, send_message_admin
+from telegram import Bot
+from telegram.ext import Application, CallbackContext
+
+from callbacks.history import HISTORY_CACHE
+from classes.admissions import ADMISSIONS
+from classes.events import FBEventListener, SimulatedEventListener
+from classes.interval import AdaptiveInterval
+from classes.leader import LEADER
+from classes.metrics import DETECTION_LAG_SECONDS, Gauge
+from classes.outbox import (OUTBOX_BATCH_SIZE, SET_LAST_ID_QUERY, OutboxItem,
+                            complete_item, enqueue_patients,
+                            get_pending_items)
+from classes.patients import Patient, get_patient_info
+from classes.routing import NOTIFICATION_ROUTER
+from classes.users import User
+from databases.firebird_db import async_fb_fetch_data
+from databases.postgresql_db import async_pg_select_data, async_pg_write_data
+from databases.queries import build_admissions_query
+from utils import (get_history_markup, is_permanent_error,
+                   send_message_admin, try_send_message)
 
 load_dotenv()
 
@@ -21,126 +32,231 @@ DEVELOP = int(os.getenv('DEVELOP'))
 GET_LAST_ID = int(os.getenv('GET_LAST_ID'))
 SET_LAST_ID = int(os.getenv('SET_LAST_ID'))
 DISABLE_NOTIFIER = int(os.getenv('DISABLE_NOTIFIER'))
+NOTIFIER_MODE = os.getenv('NOTIFIER_MODE', 'poll')
+NOTIFIER_EVENT = os.getenv('NOTIFIER_EVENT', 'main_card_insert')
+NOTIFIER_SIMULATE_TIME = float(os.getenv('NOTIFIER_SIMULATE_TIME', 10))
+NOTIFIER_MIN_TIME = float(os.getenv('NOTIFIER_MIN_TIME', 5))
+NOTIFIER_MAX_TIME = float(os.getenv('NOTIFIER_MAX_TIME', 60))
+NOTIFIER_DEVELOP_TIME = float(os.getenv('NOTIFIER_DEVELOP_TIME', 30))
 
+NOTIFIER_LOCK = asyncio.Lock()
+NOTIFIER_INTERVAL = AdaptiveInterval(NOTIFIER_MIN_TIME, NOTIFIER_MAX_TIME)
+NOTIFIER_STATS = {'interval': NOTIFIER_MIN_TIME, 'detection_lag': 0.0}
+NOTIFIER_STATE = {'last_id': None, 'outbox_pending': True}
+NOTIFIER_GAUGE = Gauge('notifier_stats',
+                       'Notifier polling interval and last detection lag '
+                       'in seconds.',
+                       ('stat',),
+                       collect=lambda: {(name,): value
+                                        for name, value
+                                        in NOTIFIER_STATS.items()})
 
-async def send_message_with_button(bot: Bot, user: User,
-                                   patient: Patient, message: str) -> None:
-    button_list = [
-        InlineKeyboardButton(
-            'Показать прошлые обращения',
-            callback_data=f'history {patient.patient_id}')
-    ]
-    reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
-    if not patient.get_full_name().strip():
-        reply_markup = None
-    await send_message(bot, user, message, reply_markup=reply_markup)
 
+async def notify_patient(bot: Bot,
+                         patient: Patient,
+                         recipients: List[User] = None) -> List[int]:
+    message = 'НОВЫЙ ПОСТУПИВШИЙ ПАЦИЕНТ:\n'
+    message += get_patient_info(patient, 'admission')
+    reply_markup = get_history_markup(patient)
+    if recipients is None:
+        recipients = NOTIFICATION_ROUTER.get_recipients(patient)
+    errors = await asyncio.gather(*[
+        try_send_message(bot, user, message, reply_markup=reply_markup)
+        for user in recipients
+    ])
+    latency = datetime.now() - patient.admission_date
+    sent = errors.count(None)
+    logging.info(f'NOTIFIER CARD_ID={patient.card_id} sent to '
+                 f'{sent}/{len(recipients)} users, '
+                 f'latency {latency}')
+    return [user.chat_id
+            for user, error in zip(recipients, errors)
+            if error is None or is_permanent_error(error)]
 
-async def send_messages(bot: Bot, patients):  # noqa: C901
-    users = get_enabled_users()
-    for patient in patients:
-        message = 'НОВЫЙ ПОСТУПИВШИЙ ПАЦИЕНТ:\n'
-        message += PatientInfo(patient).get_admission_info()
-        for user in users:
-            if user.notification_level == OWN_PATIENTS:
-                if patient.is_own(user):
-                    await send_message_with_button(bot, user, patient, message)
-                continue
-            if user.notification_level == OWN_REANIMATION_HOLE:
-                if patient.is_own(user) and patient.is_reanimation():
-                    await send_message_with_button(bot, user, patient, message)
-                continue
-            if user.notification_level == ALL_REANIMATION_HOLE:
-                if patient.is_reanimation():
-                    await send_message_with_button(bot, user, patient, message)
-                continue
-            if user.notification_level == VASCULAR_CENTER:
-                if patient.is_vascular_center():
-                    await send_message_with_button(bot, user, patient, message)
-                continue
-            if user.notification_level == THERAPY_AND_CARDIOLOGY2:
-                if patient.is_therapy_or_cardiology2():
-                    await send_message_with_button(bot, user, patient, message)
-                continue
-            if user.notification_level == ALL_NOTIFICATIONS:
-                await send_message_with_button(bot, user, patient, message)
-
-
-def get_main_card_last_id() -> Union[int, bool]:
+
+async def send_messages(bot: Bot, patients: List[Patient]) -> None:
+    await NOTIFICATION_ROUTER.load()
+    await asyncio.gather(*[notify_patient(bot, patient)
+                           for patient in patients])
+
+
+async def deliver_item(bot: Bot, item: OutboxItem) -> bool:
+    recipients = [user
+                  for user in NOTIFICATION_ROUTER.get_recipients(item.patient)
+                  if user.chat_id not in item.delivered]
+    chat_ids = await notify_patient(bot, item.patient, recipients)
+    delivered = len(chat_ids) == len(recipients) or item.expired
+    if not await complete_item(item, chat_ids, delivered):
+        logging.error(f'NOTIFIER OUTBOX ID={item.outbox_id} '
+                      'complete_item ERROR!')
+        return False
+    return delivered
+
+
+async def drain_outbox(bot: Bot) -> None:
+    items = await get_pending_items()
+    if items is None:
+        logging.error('NOTIFIER get_pending_items ERROR!')
+        return
+    await NOTIFICATION_ROUTER.load()
+    results = await asyncio.gather(*[deliver_item(bot, item)
+                                     for item in items])
+    NOTIFIER_STATE['outbox_pending'] = (len(items) >= OUTBOX_BATCH_SIZE
+                                        or not all(results))
+
+
+async def get_main_card_last_id() -> Union[int, bool]:
     select_query = ("SELECT value "
                     "FROM variables "
                     "WHERE name = 'main_card_last_id'")
-    data = pg_select_data(select_query)
+    data = await async_pg_select_data(select_query, name='get_last_id')
     if not data:
         return False
     return data[0][0]
 
 
-def set_main_card_last_id(main_card_last_id: int) -> Union[int, bool]:
-    write_query = (
-        "UPDATE variables "
-        "SET value = %s "
-        "WHERE name = 'main_card_last_id'"
-    )
-    return pg_write_data(write_query, [main_card_last_id])
+async def set_main_card_last_id(main_card_last_id: int) -> Union[int, bool]:
+    result = await async_pg_write_data(SET_LAST_ID_QUERY, [main_card_last_id],
+                                       name='set_last_id')
+    if result is not False:
+        NOTIFIER_STATE['last_id'] = main_card_last_id
+    return result
+
+
+async def get_notifier_cursor() -> Union[int, None]:
+    if NOTIFIER_STATE['last_id'] is None:
+        NOTIFIER_STATE['last_id'] = await get_main_card_last_id() or None
+    return NOTIFIER_STATE['last_id']
+
+
+async def check_develop_flags(bot: Bot, max_card_id: int) -> bool:
+    if DISABLE_NOTIFIER:
+        return False
+    if GET_LAST_ID:
+        last_id = await get_main_card_last_id()
+        await send_message_admin(bot,
+                                 f"LAST_ID: {last_id}\n"
+                                 f"LAST_ID in BSMP1_DB: {max_card_id}")
+        return False
+    if SET_LAST_ID:
+        await set_main_card_last_id(max_card_id)
+        await send_message_admin(bot,
+                                 f"LAST_ID was set to {max_card_id}")
+        return False
+    return True
 
 
-async def start_notifier(context: CallbackContext):
-    max_card_id = get_main_card_last_id()
+async def start_notifier(context: CallbackContext) -> Union[int, None]:
+    async with NOTIFIER_LOCK:
+        return await check_new_patients(context)
+
+
+async def poll_notifier(context: CallbackContext) -> None:
+    new_rows = None
+    try:
+        new_rows = await start_notifier(context)
+    finally:
+        if DEVELOP:
+            interval = NOTIFIER_DEVELOP_TIME
+        else:
+            interval = NOTIFIER_INTERVAL.update(new_rows)
+        NOTIFIER_STATS['interval'] = interval
+        context.job_queue.run_once(poll_notifier, interval)
+
+
+async def resync_admissions(_: CallbackContext) -> None:
+    if LEADER.is_leader:
+        await ADMISSIONS.resync()
+
+
+async def get_new_patients() -> Union[List[Patient], None]:
+    max_card_id = await get_notifier_cursor()
     if not max_card_id:
         logging.error('NOTIFIER get_main_card_last_id ERROR!')
-        return
-    select_query = (
-        "SELECT main_card.id_pac, "
-        "       main_card.id, "
-        "       main_card.d_in, "
-        "       main_card.d_out, "
-        "       patient.fm, "
-        "       patient.im, "
-        "       patient.ot, "
-        "       patient.dtr, "
-        "       patient.pol, "
-        "       department.short, "
-        "       main_card.remzal, "
-        "       main_card.dsnapr, "
-        "       main_card.dspriem, "
-        "       main_card.id_dvig, "
-        "       main_card.id_otkaz, "
-        "       inpatient_department.short, "
-        "       doctor.last_name "
-        "           || ' ' || doctor.first_name "
-        "           || ' ' || doctor.middle_name "
-        "FROM main_card "
-        "   LEFT JOIN pacient patient ON main_card.id_pac = patient.id "
-        "   LEFT JOIN priemnic department "
-        "       ON main_card.id_priem = department.id "
-        "   LEFT JOIN priemnic inpatient_department "
-        "       ON main_card.id_gotd = inpatient_department.id "
-        "   LEFT JOIN doctor ON main_card.amb_doc_id = doctor.doctor_id "
-        "WHERE "
-        "   main_card.id > ? "
-        "ORDER BY main_card.id"
-    )
-    patients_data = fb_select_data(select_query, [max_card_id])
-    if not patients_data:
-        return
+        return None
+    select_query = build_admissions_query("main_card.id > ?",
+                                          "notifier")
+    try:
+        patients_data = await async_fb_fetch_data(select_query,
+                                                  [max_card_id])
+    except Exception as error:
+        logging.error(f'NOTIFIER FDB QUERY: {error}')
+        return None
     patients = list()
-    for patient_data in patients_data:
+    for patient_data in patients_data or []:
         patients.append(Patient(*patient_data))
-    max_card_id = patients[-1].card_id
+    ADMISSIONS.add(patients)
+    now = datetime.now()
+    for patient in patients:
+        HISTORY_CACHE.invalidate(patient.patient_id)
+        if LEADER.is_leader:
+            DETECTION_LAG_SECONDS.observe(
+                (now - patient.admission_date).total_seconds()
+            )
+    if patients:
+        detection_lag = (datetime.now() - patients[0].admission_date)
+        NOTIFIER_STATS['detection_lag'] = detection_lag.total_seconds()
+        logging.info(f'NOTIFIER found {len(patients)} new cards, '
+                     f'detection lag {detection_lag}, '
+                     f'interval {NOTIFIER_STATS["interval"]}s')
+    return patients
+
+
+async def elect_notifier(context: CallbackContext) -> None:
+    was_leader = LEADER.is_leader
+    is_leader = await LEADER.check()
+    if is_leader and not was_leader:
+        logging.info('NOTIFIER: this instance is the leader now')
+        async with NOTIFIER_LOCK:
+            NOTIFIER_STATE['last_id'] = None
+            NOTIFIER_STATE['outbox_pending'] = True
+        context.job_queue.run_once(start_notifier, 0)
+        if ADMISSIONS.is_enabled():
+            context.job_queue.run_once(resync_admissions, 0)
+    elif was_leader and not is_leader:
+        logging.warning('NOTIFIER: leadership lost')
+
+
+async def check_new_patients(context: CallbackContext) -> Union[int, None]:
+    patients = await get_new_patients()
+    if patients is None:
+        return None
+    if not LEADER.is_leader:
+        if patients:
+            NOTIFIER_STATE['last_id'] = patients[-1].card_id
+        return len(patients)
     if DEVELOP:
-        if DISABLE_NOTIFIER:
-            return
-        if GET_LAST_ID:
-            await send_message_admin(context.bot,
-                                     f"LAST_ID: {get_main_card_last_id()}\n"
-                                     f"LAST_ID in BSMP1_DB: {max_card_id}")
-            return
-        if SET_LAST_ID:
-            set_main_card_last_id(max_card_id)
-            await send_message_admin(context.bot,
-                                     f"LAST_ID was set to {max_card_id}")
-            return
+        if patients and await check_develop_flags(context.bot,
+                                                  patients[-1].card_id):
+            await send_messages(context.bot, patients)
+        return len(patients)
+    if patients:
+        if not await enqueue_patients(patients):
+            logging.error('NOTIFIER enqueue_patients ERROR!')
+            return None
+        NOTIFIER_STATE['last_id'] = patients[-1].card_id
+        NOTIFIER_STATE['outbox_pending'] = True
+    if NOTIFIER_STATE['outbox_pending']:
+        await drain_outbox(context.bot)
+    return len(patients)
+
+
+def start_notifier_events(
+        application: Application
+) -> Union[FBEventListener, SimulatedEventListener, None]:
+    loop = asyncio.get_running_loop()
+
+    def on_event(count: int) -> None:
+        logging.info(f'NOTIFIER EVENT {NOTIFIER_EVENT}: {count}')
+        loop.call_soon_threadsafe(application.job_queue.run_once,
+                                  start_notifier, 0)
+
+    if NOTIFIER_MODE == 'events':
+        listener = FBEventListener(NOTIFIER_EVENT, on_event)
+    elif NOTIFIER_MODE == 'simulate':
+        listener = SimulatedEventListener(NOTIFIER_EVENT, on_event,
+                                          NOTIFIER_SIMULATE_TIME)
     else:
-        set_main_card_last_id(max_card_id)
-    await send_messages(context.bot, patients)
+        return None
+    listener.start()
+    return listener
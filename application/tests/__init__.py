@@ -0,0 +1,4 @@
+import os
+
+os.environ.setdefault('DEVELOP', '0')
+os.environ.setdefault('PG_PORT', '5432')
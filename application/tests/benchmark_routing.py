@@ -0,0 +1,97 @@
+import argparse
+import random
+import time
+from datetime import datetime
+from typing import List
+
+from classes.departments import CARDIOLOGY, CARDIOLOGY2, NEUROLOGY
+from classes.patients import Patient
+from classes.routing import NotificationRouter
+from classes.users import User, UserDirectory
+from constants import (ALL_NOTIFICATIONS, ALL_REANIMATION_HOLE,
+                       NO_NOTIFICATION, OWN_PATIENTS, OWN_REANIMATION_HOLE,
+                       THERAPY_AND_CARDIOLOGY2, VASCULAR_CENTER)
+
+DEPARTMENTS = [
+    '1 ХИРУРГИЯ', '2 ХИРУРГИЯ', 'ГНОЙНАЯ ХИРУРГИЯ',
+    '1 ТЕРАПИЯ', '2 ТЕРАПИЯ',
+    CARDIOLOGY, CARDIOLOGY2, NEUROLOGY,
+    'ТРАВМАТОЛОГИЯ', 'УРОЛОГИЯ', 'ГИНЕКОЛОГИЯ',
+]
+LEVELS = [NO_NOTIFICATION, OWN_PATIENTS, OWN_REANIMATION_HOLE,
+          ALL_REANIMATION_HOLE, ALL_NOTIFICATIONS, VASCULAR_CENTER,
+          THERAPY_AND_CARDIOLOGY2]
+
+
+def is_recipient(user: User, patient: Patient) -> bool:
+    if user.notification_level == OWN_PATIENTS:
+        return patient.is_own(user)
+    if user.notification_level == OWN_REANIMATION_HOLE:
+        return patient.is_own(user) and patient.is_reanimation()
+    if user.notification_level == ALL_REANIMATION_HOLE:
+        return patient.is_reanimation()
+    if user.notification_level == VASCULAR_CENTER:
+        return patient.is_vascular_center()
+    if user.notification_level == THERAPY_AND_CARDIOLOGY2:
+        return patient.is_therapy_or_cardiology2()
+    return user.notification_level == ALL_NOTIFICATIONS
+
+
+def make_users(count: int) -> List[User]:
+    return [User('Ф', 'И', 'О', random.choice(DEPARTMENTS), '',
+                 chat_id, '', random.choice(LEVELS), True, False, chat_id)
+            for chat_id in range(count)]
+
+
+def make_patients(count: int) -> List[Patient]:
+    now = datetime.now()
+    return [Patient(card_id, card_id, now, now, 'Ф', 'И', 'О', now, 'М',
+                    random.choice(DEPARTMENTS), random.choice('FT'),
+                    '', '', 10, 0, '', '')
+            for card_id in range(count)]
+
+
+def run(user_count: int, patients: List[Patient]) -> None:
+    directory = UserDirectory(0)
+    directory.set_users(make_users(user_count))
+    start = time.perf_counter()
+    scanned = [[user
+                for user in directory.enabled
+                if is_recipient(user, patient)]
+               for patient in patients]
+    scan_time = time.perf_counter() - start
+    start = time.perf_counter()
+    router = NotificationRouter()
+    router.build(directory)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    routed = [router.get_recipients(patient) for patient in patients]
+    route_time = time.perf_counter() - start
+    for expected, recipients in zip(scanned, routed):
+        if ({user.chat_id for user in expected}
+                != {user.chat_id for user in recipients}):
+            raise SystemExit(f'{user_count} users: recipients differ')
+    print(f'{user_count:>6} users: scan {scan_time * 1000:8.1f} ms, '
+          f'router {route_time * 1000:6.1f} ms '
+          f'(+ build {build_time * 1000:.1f} ms)')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description='Compare the notification router with the per-user '
+                    'if-chain it replaced.'
+    )
+    parser.add_argument('--users', type=int, nargs='+',
+                        default=[100, 1000, 5000])
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    patients = make_patients(args.patients)
+    print(f'{args.patients} patients')
+    for user_count in args.users:
+        run(user_count, patients)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import re
+import unittest
+
+from utils import (MessageChunker, chunk_messages, get_message_size,
+                   split_line)
+
+TAG_PATTERN = re.compile(r'<(/?)(\w+)[^>]*>')
+
+
+def get_text(html: str) -> str:
+    return TAG_PATTERN.sub('', html)
+
+
+def is_balanced(html: str) -> bool:
+    stack = list()
+    for closing, name in TAG_PATTERN.findall(html):
+        if not closing:
+            stack.append(name)
+        elif not stack or stack.pop() != name:
+            return False
+    return not stack
+
+
+class SplitLineTest(unittest.TestCase):
+    def test_short_line_is_kept(self):
+        self.assertEqual(list(split_line('<b>abc</b>', 100)),
+                         ['<b>abc</b>'])
+
+    def test_plain_text(self):
+        chunks = list(split_line('x' * 25, 10))
+        self.assertEqual(chunks, ['x' * 10, 'x' * 10, 'x' * 5])
+
+    def test_size_is_counted_in_utf16(self):
+        line = '😀' * 10
+        self.assertEqual(get_message_size(line), 20)
+        chunks = list(split_line(line, 5))
+        self.assertEqual(''.join(chunks), line)
+        for chunk in chunks:
+            self.assertLessEqual(get_message_size(chunk), 5)
+            self.assertEqual(chunk, '😀' * (len(chunk)))
+
+    def test_surrogate_pairs_are_not_split(self):
+        line = 'a' + '😀' * 6
+        chunks = list(split_line(line, 4))
+        self.assertEqual(''.join(chunks), line)
+        for chunk in chunks:
+            chunk.encode('utf-8')
+            self.assertLessEqual(get_message_size(chunk), 4)
+
+    def test_entities_are_not_split(self):
+        line = 'a&amp;b&lt;c&#8470;d' * 5
+        chunks = list(split_line(line, 8))
+        self.assertEqual(''.join(chunks), line)
+        for chunk in chunks:
+            self.assertNotRegex(chunk, r'&[#\w]*$')
+            self.assertNotRegex(chunk, r'^[#\w]*;')
+
+    def test_tags_are_balanced(self):
+        line = '<b>' + 'x' * 30 + '</b>'
+        chunks = list(split_line(line, 20))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(get_text(chunk) for chunk in chunks),
+                         'x' * 30)
+        for chunk in chunks:
+            self.assertTrue(is_balanced(chunk), chunk)
+            self.assertLessEqual(get_message_size(chunk), 20)
+
+    def test_nested_tags_are_reopened_in_order(self):
+        line = '<b>bold <i>' + 'y' * 40 + '</i> end</b>'
+        chunks = list(split_line(line, 24))
+        self.assertEqual(''.join(get_text(chunk) for chunk in chunks),
+                         get_text(line))
+        for chunk in chunks:
+            self.assertTrue(is_balanced(chunk), chunk)
+            self.assertLessEqual(get_message_size(chunk), 24)
+        self.assertTrue(chunks[1].startswith('<b><i>'))
+
+    def test_tag_attributes_are_kept_when_reopened(self):
+        line = '<a href="tg://user?id=1">' + 'z' * 40 + '</a>'
+        chunks = list(split_line(line, 40))
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith('<a href="tg://user?id=1">'))
+            self.assertTrue(chunk.endswith('</a>'))
+            self.assertLessEqual(get_message_size(chunk), 40)
+
+    def test_opening_tag_at_boundary_moves_to_next_chunk(self):
+        line = 'x' * 8 + '<b>yy</b>'
+        chunks = list(split_line(line, 10))
+        self.assertEqual(chunks, ['x' * 8, '<b>yy</b>'])
+
+    def test_closing_tag_at_boundary_stays_in_chunk(self):
+        line = '<b>' + 'x' * 3 + '</b>' + 'y' * 5
+        chunks = list(split_line(line, 10))
+        self.assertEqual(chunks[0], '<b>xxx</b>')
+        self.assertEqual(''.join(chunks), line)
+
+
+class MessageChunkerTest(unittest.TestCase):
+    def test_blocks_are_packed_up_to_max_size(self):
+        blocks = ['a' * 4 + '\n', 'b' * 4 + '\n', 'c' * 4 + '\n']
+        messages = list(chunk_messages(blocks, max_size=10))
+        self.assertEqual(messages, ['aaaa\nbbbb\n', 'cccc\n'])
+
+    def test_header_starts_first_message(self):
+        messages = list(chunk_messages(['body\n'], 'head\n', 100))
+        self.assertEqual(messages, ['head\nbody\n'])
+
+    def test_nothing_to_send(self):
+        self.assertEqual(list(chunk_messages([])), [])
+
+    def test_long_block_is_split_by_lines(self):
+        block = ''.join(f'<b>{index}</b> line\n' for index in range(50))
+        messages = list(chunk_messages([block], max_size=64))
+        self.assertEqual(''.join(messages), block)
+        for message in messages:
+            self.assertLessEqual(get_message_size(message), 64)
+            self.assertTrue(is_balanced(message), message)
+
+    def test_long_line_is_split_by_tags(self):
+        block = '<i>' + 'щ' * 100 + '</i>\n'
+        messages = list(chunk_messages(['head\n', block], max_size=32))
+        self.assertEqual(''.join(get_text(message) for message in messages),
+                         get_text('head\n' + block))
+        for message in messages:
+            self.assertLessEqual(get_message_size(message), 32)
+            self.assertTrue(is_balanced(message), message)
+
+    def test_add_returns_full_messages_and_flush_the_rest(self):
+        chunker = MessageChunker('', 10)
+        self.assertEqual(chunker.add('a' * 6), [])
+        self.assertEqual(chunker.add('b' * 6), ['a' * 6])
+        self.assertEqual(chunker.flush(), ['b' * 6])
+        self.assertEqual(chunker.flush(), [])
+
+    def test_header_is_ready_before_first_block(self):
+        chunker = MessageChunker('h' * 15, 10)
+        self.assertEqual(chunker.add('x'), ['h' * 10])
+        self.assertEqual(chunker.flush(), ['h' * 5 + 'x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
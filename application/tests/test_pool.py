@@ -0,0 +1,127 @@
+import threading
+import time
+import unittest
+
+from databases.pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, number: int):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def make_pool(self, **kwargs) -> ConnectionPool:
+        self.connections = list()
+
+        def connect():
+            connection = FakeConnection(len(self.connections))
+            self.connections.append(connection)
+            return connection
+
+        def ping(connection):
+            if not connection.alive:
+                raise ConnectionError('dead')
+
+        options = dict(min_size=0, max_size=2, idle_timeout=600,
+                       ping_interval=60, acquire_timeout=None)
+        options.update(kwargs)
+        return ConnectionPool('TEST', connect, ping, lambda _: None,
+                              **options)
+
+    def test_release_reuses_connection(self):
+        pool = self.make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(pool.get_stats()['in_use'], 1)
+
+    def test_acquire_times_out_when_exhausted(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=0.05)
+        pool.acquire()
+        start = time.monotonic()
+        self.assertIsNone(pool.acquire())
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        stats = pool.get_stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waiting'], 0)
+        self.assertEqual(stats['size'], 1)
+
+    def test_waiting_acquire_gets_released_connection(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=5)
+        connection = pool.acquire()
+        timer = threading.Timer(0.05, pool.release, (connection,))
+        timer.start()
+        self.assertIs(pool.acquire(), connection)
+        timer.join()
+        self.assertEqual(pool.get_stats()['timeouts'], 0)
+
+    def test_discard_frees_slot(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=0.05)
+        connection = pool.acquire()
+        pool.discard(connection)
+        self.assertTrue(connection.closed)
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.get_stats()['discarded'], 1)
+
+    def test_failed_connect_frees_slot(self):
+        pool = self.make_pool(max_size=1, acquire_timeout=0.05)
+        pool.connect = lambda: None
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(pool.get_stats()['size'], 0)
+        self.assertEqual(pool.get_stats()['timeouts'], 0)
+
+    def test_idle_connections_expire(self):
+        pool = self.make_pool(idle_timeout=0)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        time.sleep(0.01)
+        third = pool.acquire()
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+        self.assertNotIn(third, (first, second))
+        self.assertEqual(pool.get_stats()['size'], 1)
+
+    def test_idle_expiry_keeps_min_size(self):
+        pool = self.make_pool(min_size=1, idle_timeout=0)
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.release(second)
+        time.sleep(0.01)
+        pool.close_expired()
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(pool.get_stats()['idle'], 1)
+
+    def test_stale_idle_connection_is_pinged(self):
+        pool = self.make_pool(ping_interval=0)
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.alive = False
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()['size'], 1)
+
+    def test_discard_idle(self):
+        pool = self.make_pool()
+        first, second = pool.acquire(), pool.acquire()
+        pool.release(first)
+        pool.discard_idle()
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        stats = pool.get_stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['discarded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
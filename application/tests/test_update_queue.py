@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from telegram import Update
+
+from classes.update_processor import UpdateQueue
+
+
+class UpdateQueueTest(unittest.IsolatedAsyncioTestCase):
+    async def test_put_waits_for_space(self):
+        queue = UpdateQueue(1, 10)
+        await queue.put(Update(1))
+        put = asyncio.create_task(queue.put(Update(2)))
+        await asyncio.sleep(0.01)
+        self.assertFalse(put.done())
+        with self.assertRaises(asyncio.QueueFull):
+            queue.put_nowait(Update(3))
+        self.assertEqual((await queue.get()).update_id, 1)
+        await asyncio.wait_for(put, 1)
+        self.assertEqual(queue.qsize(), 1)
+
+    async def test_stop_signal_bypasses_limit(self):
+        queue = UpdateQueue(1, 10)
+        stop = object()
+        await queue.put(Update(1))
+        await asyncio.wait_for(queue.put(stop), 1)
+        self.assertEqual(queue.qsize(), 2)
+        await queue.get()
+        self.assertIs(await queue.get(), stop)
+
+    async def test_get_counts_in_flight(self):
+        queue = UpdateQueue(10, 2)
+        for update_id in range(3):
+            await queue.put(Update(update_id))
+        await queue.get()
+        await queue.get()
+        self.assertEqual(queue.get_stats(), {'queued': 1, 'in_flight': 2})
+        get = asyncio.create_task(queue.get())
+        await asyncio.sleep(0.01)
+        self.assertFalse(get.done())
+        queue.task_done()
+        self.assertEqual((await asyncio.wait_for(get, 1)).update_id, 2)
+        self.assertEqual(queue.get_stats(), {'queued': 0, 'in_flight': 2})
+
+    async def test_drained_updates_do_not_go_negative(self):
+        queue = UpdateQueue(10, 2)
+        await queue.put(Update(1))
+        queue.get_nowait()
+        queue.task_done()
+        self.assertEqual(queue.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
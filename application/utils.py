@@ -1,43 +1,87 @@
+import asyncio
 import logging
+import re
+from contextlib import aclosing
 from datetime import date, datetime, time, timedelta
-from typing import List
+from functools import lru_cache
+from typing import (AsyncGenerator, AsyncIterable, AsyncIterator, Iterable,
+                    Iterator, List, Tuple, Union)
 
 from telegram import (Bot, InlineKeyboardButton, InlineKeyboardMarkup,
-                      ReplyKeyboardRemove, Update)
+                      Message, ReplyKeyboardRemove, Update)
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import BadRequest, Forbidden, TelegramError
 from telegram.ext import ContextTypes
 
+from classes.metrics import SEND_SECONDS
+from classes.patients import PATIENT_INFO_CACHE_SIZE, Patient
+from classes.sender import SENDER
 from classes.to_delete import ToDelete
-from classes.users import User, get_admin_users, get_enabled_users
+from classes.tracing import span, traced
+from classes.users import (User, get_admin_users, get_enabled_users,
+                           get_user)
+from constants import MESSAGE_MAX_SIZE
 
+HTML_TOKEN_PATTERN = re.compile(r'<[^>]*>?|&#?\w+;|.', re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'<\s*(/?)\s*([\w-]+)')
 
-async def send_message(bot: Bot,
-                       user: User,
-                       message_text: str,
-                       reply_markup=None):
+
+async def send_chat_message(bot: Bot,
+                            chat_id: int,
+                            message_text: str,
+                            **kwargs) -> Message:
+    with SEND_SECONDS.time():
+        return await SENDER.send_once(bot, chat_id, message_text, **kwargs)
+
+
+async def reply_message(message: Message,
+                        text: str,
+                        **kwargs) -> Message:
+    return await send_chat_message(message.get_bot(), message.chat_id, text,
+                                   **kwargs)
+
+
+async def try_send_message(bot: Bot,
+                           user: User,
+                           message_text: str,
+                           reply_markup=None) -> Union[TelegramError, None]:
     try:
-        await bot.send_message(user.chat_id,
-                               message_text,
-                               reply_markup=reply_markup,
-                               parse_mode=ParseMode.HTML)
+        with SEND_SECONDS.time():
+            await SENDER.send(bot,
+                              user.chat_id,
+                              message_text,
+                              reply_markup=reply_markup,
+                              parse_mode=ParseMode.HTML)
     except TelegramError as error:
         logging.error('Sending message to '
                       f'<{user.get_full_name()}> ERROR: {error}')
-    else:
-        logging.info(f'Sending message to <{user.get_full_name()}> SUCCESS')
+        return error
+    logging.info(f'Sending message to <{user.get_full_name()}> SUCCESS')
+    return None
+
+
+def is_permanent_error(error: TelegramError) -> bool:
+    return isinstance(error, (BadRequest, Forbidden))
+
+
+async def send_message(bot: Bot,
+                       user: User,
+                       message_text: str,
+                       reply_markup=None) -> bool:
+    error = await try_send_message(bot, user, message_text, reply_markup)
+    return error is None
 
 
 async def send_message_all(bot: Bot, message_text: str, reply_markup=None):
-    users = get_enabled_users()
-    for user in users:
-        await send_message(bot, user, message_text, reply_markup)
+    users = await get_enabled_users()
+    await asyncio.gather(*[send_message(bot, user, message_text, reply_markup)
+                           for user in users])
 
 
 async def send_message_admin(bot: Bot, message_text: str, reply_markup=None):
-    admin_users = get_admin_users()
-    for admin in admin_users:
-        await send_message(bot, admin, message_text, reply_markup)
+    admin_users = await get_admin_users()
+    await asyncio.gather(*[send_message(bot, admin, message_text, reply_markup)
+                           for admin in admin_users])
 
 
 def build_menu(buttons, n_cols,
@@ -51,15 +95,141 @@ def build_menu(buttons, n_cols,
     return menu
 
 
+@lru_cache(maxsize=PATIENT_INFO_CACHE_SIZE)
+def build_history_markup(patient_id: int) -> InlineKeyboardMarkup:
+    button_list = [
+        InlineKeyboardButton(
+            'Показать прошлые обращения',
+            callback_data=f'history {patient_id}')
+    ]
+    return InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
+
+
+def get_history_markup(patient: Patient) -> Union[InlineKeyboardMarkup, None]:
+    if not patient.get_full_name().strip():
+        return None
+    return build_history_markup(patient.patient_id)
+
+
+def get_message_size(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
+
+
+def get_closing_tag(name: str) -> str:
+    return f'</{name}>'
+
+
+def split_line(line: str, max_size: int) -> Iterator[str]:
+    open_tags: List[Tuple[str, str]] = list()
+    parts: List[str] = list()
+    size = 0
+    close_size = 0
+    has_text = False
+    for token in HTML_TOKEN_PATTERN.findall(line):
+        token_size = get_message_size(token)
+        match = HTML_TAG_PATTERN.match(token)
+        if match and match.group(1):
+            for index in range(len(open_tags) - 1, -1, -1):
+                if open_tags[index][0] == match.group(2):
+                    close_size -= get_message_size(
+                        get_closing_tag(open_tags.pop(index)[0])
+                    )
+                    break
+            parts.append(token)
+            size += token_size
+            continue
+        needed = size + token_size + close_size
+        if match:
+            needed += get_message_size(get_closing_tag(match.group(2))) + 1
+        if needed > max_size and has_text:
+            yield ''.join(parts + [get_closing_tag(name)
+                                   for name, _ in reversed(open_tags)])
+            parts = [tag for _, tag in open_tags]
+            size = sum(get_message_size(tag) for tag in parts)
+            has_text = False
+        parts.append(token)
+        size += token_size
+        if match:
+            open_tags.append((match.group(2), token))
+            close_size += get_message_size(get_closing_tag(match.group(2)))
+        else:
+            has_text = True
+    if parts:
+        yield ''.join(parts)
+
+
+def split_block(block: str, max_size: int) -> Iterator[str]:
+    if get_message_size(block) <= max_size:
+        yield block
+        return
+    for line in block.splitlines(keepends=True):
+        if get_message_size(line) <= max_size:
+            yield line
+            continue
+        yield from split_line(line, max_size)
+
+
+class MessageChunker:
+    def __init__(self, header: str = '', max_size: int = MESSAGE_MAX_SIZE):
+        self.max_size = max_size
+        self.parts: List[str] = list()
+        self.size = 0
+        self.ready: List[str] = list()
+        if header:
+            self.ready = self.add(header)
+
+    def add(self, block: str) -> List[str]:
+        messages, self.ready = self.ready, list()
+        for part in split_block(block, self.max_size):
+            part_size = get_message_size(part)
+            if self.parts and self.size + part_size > self.max_size:
+                messages.extend(self.flush())
+            self.parts.append(part)
+            self.size += part_size
+        return messages
+
+    def flush(self) -> List[str]:
+        messages, self.ready = self.ready, list()
+        if self.parts:
+            messages.append(''.join(self.parts))
+            self.parts.clear()
+            self.size = 0
+        return messages
+
+
+def chunk_messages(blocks: Iterable[str],
+                   header: str = '',
+                   max_size: int = MESSAGE_MAX_SIZE) -> Iterator[str]:
+    chunker = MessageChunker(header, max_size)
+    for block in blocks:
+        yield from chunker.add(block)
+    yield from chunker.flush()
+
+
+async def iterate_messages(
+        messages: Union[Iterable[str], AsyncIterable[str]]
+) -> AsyncIterator[str]:
+    if isinstance(messages, AsyncGenerator):
+        async with aclosing(messages):
+            async for message in messages:
+                yield message
+        return
+    if isinstance(messages, AsyncIterable):
+        async for message in messages:
+            yield message
+        return
+    for message in messages:
+        yield message
+
+
 def private_access(coroutine):
     async def coroutine_restrict(update: Update,
                                  context: ContextTypes.DEFAULT_TYPE):
         chat_id = update.message.chat_id
-        users = get_enabled_users()
-        for user in users:
-            if user.chat_id == chat_id:
-                return await coroutine(update, context)
-        return await update.message.reply_text('[ДОСТУП ЗАКРЫТ]')
+        user = await get_user(chat_id)
+        if user and user.enable:
+            return await coroutine(update, context)
+        return await reply_message(update.message, '[ДОСТУП ЗАКРЫТ]')
     return coroutine_restrict
 
 
@@ -84,37 +254,48 @@ def get_diary_today() -> date:
     return diary_today
 
 
-async def send_message_list(update: Update,
-                            message_list: List[str],
-                            remove_button_title: str):
+@traced
+async def send_message_list(
+        update: Update,
+        message_list: Union[Iterable[str], AsyncIterable[str]],
+        remove_button_title: str):
     chat_id = update.message.chat_id
-    to_delete = ToDelete(chat_id=chat_id)
+    to_delete = await ToDelete.create(chat_id)
     button_list = [
         InlineKeyboardButton(
             remove_button_title,
             callback_data=f'delete {to_delete.to_delete_id}')
     ]
     reply_markup = InlineKeyboardMarkup(build_menu(button_list, n_cols=1))
+    message_text = None
     try:
-        for message_text in message_list[:-1]:
-            to_delete.add(
-                await update.message.reply_text(
-                    message_text,
-                    reply_markup=ReplyKeyboardRemove(),
-                    parse_mode=ParseMode.HTML
+        async with aclosing(iterate_messages(message_list)) as messages:
+            async for next_message_text in messages:
+                if message_text is not None:
+                    with span('reply_text'):
+                        to_delete.add(
+                            await reply_message(
+                                update.message,
+                                message_text,
+                                reply_markup=ReplyKeyboardRemove(),
+                                parse_mode=ParseMode.HTML
+                            )
+                        )
+                message_text = next_message_text
+        if message_text is not None:
+            with span('reply_text'):
+                to_delete.add(
+                    await reply_message(
+                        update.message,
+                        message_text,
+                        reply_markup=reply_markup,
+                        parse_mode=ParseMode.HTML
+                    )
                 )
-            )
-        else:
-            to_delete.add(
-                await update.message.reply_text(
-                    message_list[-1],
-                    reply_markup=reply_markup,
-                    parse_mode=ParseMode.HTML
-                )
-            )
     except TelegramError as error:
         logging.error('Sending message_list to '
                       f'CHAT_ID={chat_id} ERROR: {error}')
     else:
         logging.info(f'Sending message_list to CHAT_ID={chat_id} SUCCESS')
-    to_delete.save()
+    if to_delete.messages_ids:
+        await to_delete.save()